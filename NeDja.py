@@ -1,20 +1,44 @@
 import asyncio
+import codecs
+import cProfile
+import heapq
+import gzip
+import hashlib
+import io
 import json
 import logging
 import os
+import pstats
+import queue
+import shutil
 import subprocess
 import sys
+import threading
+import tracemalloc
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta
+from html import escape
+from itertools import chain, combinations, islice
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from math import ceil
+from operator import itemgetter
 
 import aiogram.exceptions
 import psutil
 import pyautogui
-from aiogram import Bot, Dispatcher, F, types
+from aiohttp import web
+from aiogram import BaseMiddleware, Bot, Dispatcher, F, types
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.dispatcher.flags import get_flag
 from aiogram.filters import Command, CommandStart
-from aiogram.types import BotCommand, CallbackQuery, InlineKeyboardButton, Message, FSInputFile
+from aiogram.methods import AnswerCallbackQuery
+from aiogram.types import (BotCommand, CallbackQuery, InlineKeyboardButton, InlineQuery,
+                           InlineQueryResultArticle, InputTextMessageContent, Message, FSInputFile, Update,
+                           WebAppInfo, BufferedInputFile)
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 import keyboard
 import ctypes
+from ctypes import wintypes
 import time
 import win32gui
 import win32con
@@ -25,6 +49,10 @@ import configparser
 import urllib.parse
 from typing import Optional, List
 
+from botapi import file_ref, make_session
+from remote import FakeInput, RemoteServer
+from volume import MASTER, Mixer, make_audio
+
 # ==========================
 # БАЗОВАЯ НАСТРОЙКА
 # ==========================
@@ -57,6 +85,26 @@ try:
     USER_ID = config.getint('Settings', 'USER_ID')
     DEFAULT_SEARCH_ENGINE = config.get('Settings', 'DEFAULT_SEARCH_ENGINE', fallback='google')
     PREFERRED_SEARCH_BROWSER_KEY = config.get('Settings', 'PREFERRED_SEARCH_BROWSER_KEY', fallback='').strip()
+    LAUNCH_TRACK_TIMEOUT = config.getint('Settings', 'LAUNCH_TRACK_TIMEOUT', fallback=90)
+    CALLBACK_ACK_BUDGET_MS = config.getint('Settings', 'CALLBACK_ACK_BUDGET_MS', fallback=300)
+    BOT_API_URL = config.get('Settings', 'BOT_API_URL', fallback='').strip()
+    BOT_API_LOCAL = config.getboolean('Settings', 'BOT_API_LOCAL', fallback=False)
+    HTTP_POOL_SIZE = config.getint('Settings', 'HTTP_POOL_SIZE', fallback=100)
+    HTTP_KEEPALIVE = config.getfloat('Settings', 'HTTP_KEEPALIVE', fallback=15.0)
+    HTTP_TIMEOUT = config.getfloat('Settings', 'HTTP_TIMEOUT', fallback=60.0)
+    JOURNAL_MAX_MB = config.getint('Settings', 'JOURNAL_MAX_MB', fallback=5)
+    JOURNAL_BACKUPS = config.getint('Settings', 'JOURNAL_BACKUPS', fallback=10)
+    FILE_BROWSER_ROOTS = config.get('Settings', 'FILE_BROWSER_ROOTS', fallback='')
+    WEBAPP_URL = config.get('Settings', 'WEBAPP_URL', fallback='').strip()
+    WEBAPP_HOST = config.get('Settings', 'WEBAPP_HOST', fallback='127.0.0.1').strip()
+    WEBAPP_PORT = config.getint('Settings', 'WEBAPP_PORT', fallback=8765)
+    INPUT_BACKEND = config.get('Settings', 'INPUT_BACKEND', fallback='win32').strip().lower()
+    AUDIO_BACKEND = config.get('Settings', 'AUDIO_BACKEND', fallback='pycaw').strip().lower()
+    SCRIPT_TIMEOUT = config.getint('Settings', 'SCRIPT_TIMEOUT', fallback=600)
+    SCRIPT_MAX_PARALLEL = config.getint('Settings', 'SCRIPT_MAX_PARALLEL', fallback=2)
+    LOW_IMPACT = config.get('Settings', 'LOW_IMPACT', fallback='auto').strip().lower()
+    GAME_PROCESSES = config.get('Settings', 'GAME_PROCESSES', fallback='cs2.exe')
+    LOW_IMPACT_CORES = config.getint('Settings', 'LOW_IMPACT_CORES', fallback=2)
 except (configparser.Error, ValueError) as e:
     logging.error(f"Ошибка чтения config.ini: {e}")
     sys.exit(1)
@@ -77,9 +125,29 @@ if DEFAULT_SEARCH_ENGINE not in SEARCH_ENGINES:
     with open(CONFIG_PATH, 'w', encoding='utf-8') as configfile:
         config.write(configfile)
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-
-bot = Bot(token=BOT_TOKEN)
+# Логи и журнал действий пишутся в фоновом потоке: хендлеры только кладут запись в очередь
+JOURNAL_PATH = APP_DIR / 'logs' / 'actions.jsonl'
+log_queue = queue.SimpleQueue()
+journal_queue = queue.SimpleQueue()
+_console_handler = logging.StreamHandler()
+_console_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+# force: предупреждения при разборе config.ini выше уже настроили корневой логгер на stderr
+# (уровень WARNING) — без force очередь не подключится и INFO пропадут
+logging.basicConfig(level=logging.INFO, handlers=[QueueHandler(log_queue)], force=True)
+log_listeners = [QueueListener(log_queue, _console_handler)]
+
+if BOT_API_LOCAL and not BOT_API_URL:
+    logging.warning("BOT_API_LOCAL включён, но BOT_API_URL не задан. Используется публичный Bot API.")
+    BOT_API_LOCAL = False
+
+# Лимит размера отправляемого файла: облачный Bot API — 50 МБ, локальный сервер — 2000 МБ
+MAX_UPLOAD_MB = 2000 if BOT_API_LOCAL else 50
+
+def input_file(path: Path):
+    return file_ref(path, BOT_API_LOCAL)
+
+# Сессия и ссылки на файлы — в botapi.py (проверяются против подставного сервера)
+bot = Bot(token=BOT_TOKEN, session=make_session(BOT_API_URL, BOT_API_LOCAL, HTTP_POOL_SIZE, HTTP_KEEPALIVE, HTTP_TIMEOUT))
 dp = Dispatcher()
 
 user_data = {
@@ -99,6 +167,305 @@ record_state = {
 }
 last_clip_by_user: dict[int, Optional[Path]] = {}
 
+# ==========================
+# ЖУРНАЛ ДЕЙСТВИЙ
+# ==========================
+
+class JournalFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds')}
+        entry.update(record.action)
+        return json.dumps(entry, ensure_ascii=False)
+
+def _gzip_rotator(source: str, dest: str):
+    with open(source, 'rb') as src, gzip.open(dest, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+def _make_journal_handler() -> logging.Handler:
+    JOURNAL_PATH.parent.mkdir(exist_ok=True)
+    handler = RotatingFileHandler(JOURNAL_PATH, maxBytes=JOURNAL_MAX_MB * 1024 * 1024,
+                                  backupCount=JOURNAL_BACKUPS, encoding='utf-8')
+    handler.namer = lambda name: f"{name}.gz"
+    handler.rotator = _gzip_rotator
+    handler.setFormatter(JournalFormatter())
+    return handler
+
+action_log = logging.getLogger('nedja.actions')
+action_log.propagate = False
+action_log.setLevel(logging.INFO)
+action_log.addHandler(QueueHandler(journal_queue))
+
+def journal_action(action: str, duration: float, outcome: str, **extra):
+    """Записывает действие в журнал. Только кладёт запись в очередь — запись на диск идёт в фоне."""
+    entry = {'action': action, 'duration_ms': round(duration * 1000, 1), 'outcome': outcome}
+    entry.update(extra)
+    action_log.info(action, extra={'action': entry})
+
+def _update_action(update: Update) -> str:
+    if update.callback_query:
+        return f"callback:{update.callback_query.data}"
+    if update.inline_query:
+        return "inline"
+    message = update.message
+    if message:
+        if message.document:
+            return "document"
+        text = message.text or ""
+        if text.startswith('/'):
+            return f"command:{text.split()[0][1:].split('@')[0]}"
+        return f"text:{text[:40]}"
+    return update.event_type
+
+class JournalMiddleware(BaseMiddleware):
+    """Пишет каждое обработанное обновление в журнал: id, действие, длительность, исход."""
+
+    async def __call__(self, handler, event: Update, data: dict):
+        started = time.perf_counter()
+        try:
+            result = await handler(event, data)
+        except Exception as e:
+            journal_action(_update_action(event), time.perf_counter() - started, 'error',
+                           update_id=event.update_id, error=f"{type(e).__name__}: {e}")
+            raise
+        outcome = 'unhandled' if result is UNHANDLED else 'ok'
+        journal_action(_update_action(event), time.perf_counter() - started, outcome, update_id=event.update_id)
+        return result
+
+dp.update.outer_middleware(JournalMiddleware())
+log_listeners.append(QueueListener(journal_queue, _make_journal_handler()))
+
+def iter_journal(day: str):
+    """Записи журнала за день (YYYY-MM-DD), включая сжатые архивы, в хронологическом порядке."""
+    files = sorted(JOURNAL_PATH.parent.glob(f"{JOURNAL_PATH.name}.*.gz"),
+                   key=lambda p: int(p.name.split('.')[-2]), reverse=True)
+    if JOURNAL_PATH.exists():
+        files.append(JOURNAL_PATH)
+    for path in files:
+        opener = gzip.open if path.suffix == '.gz' else open
+        with opener(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith(f'{{"ts": "{day}'):
+                    yield json.loads(line)
+
+def journal_summary(day: str) -> str:
+    stats: dict[str, list] = {}
+    for entry in iter_journal(day):
+        stats.setdefault(entry['action'], []).append(entry)
+    if not stats:
+        return f"За {day} действий в журнале нет."
+    lines = [f"Журнал за {day}:"]
+    for action, entries in sorted(stats.items(), key=lambda kv: -len(kv[1])):
+        durations = sorted(e['duration_ms'] for e in entries)
+        errors = sum(1 for e in entries if e['outcome'] == 'error')
+        p95 = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+        line = f"• {action}: {len(entries)} раз, медиана {durations[len(durations) // 2]:.0f} мс, p95 {p95:.0f} мс"
+        if errors:
+            line += f", ошибок: {errors}"
+        lines.append(line)
+    return "\n".join(lines)
+
+@dp.message(Command("journal"))
+async def show_journal(message: Message):
+    if not has_access(message):
+        return
+    day = message.text.partition(' ')[2].strip() or datetime.now().strftime('%Y-%m-%d')
+    if not re.fullmatch(r'\d{4}-\d{2}-\d{2}', day):
+        await message.answer("Использование: /journal [ГГГГ-ММ-ДД]")
+        return
+    summary = await asyncio.to_thread(journal_summary, day)
+    await message.answer(summary[:4000])
+
+# ==========================
+# КЭШ FILE_ID ОТПРАВЛЕННЫХ ФАЙЛОВ
+# ==========================
+
+MEDIA_CACHE_PATH = APP_DIR / 'media_cache.json'
+MEDIA_CACHE_SIZE = 1000
+HASH_CHUNK = 1024 * 1024
+
+class MediaCache:
+    """Хэш содержимого → file_id Telegram после первой загрузки (LRU, хранится на диске).
+
+    Для каждого пути запоминаются размер и mtime: если они не изменились, файл
+    не хэшируется заново. Ключ включает тип отправки (photo/video/document),
+    потому что file_id фото нельзя отправить как документ.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.file_ids: OrderedDict[str, str] = OrderedDict()          # "kind:sha256" → file_id
+        self.digests: OrderedDict[str, tuple[int, int, str]] = OrderedDict()  # путь → (size, mtime_ns, sha256)
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.file_ids = OrderedDict(data.get('file_ids', {}))
+            self.digests = OrderedDict((k, tuple(v)) for k, v in data.get('digests', {}).items())
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, AttributeError) as e:
+            logging.warning(f"Кэш file_id не прочитан ({e}), начинаю с пустого.")
+
+    def save(self):
+        try:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump({'file_ids': self.file_ids, 'digests': self.digests}, f, ensure_ascii=False)
+        except OSError as e:
+            logging.error(f"Ошибка сохранения {self.path.name}: {e}")
+
+    def digest(self, path: Path) -> str:
+        st = path.stat()
+        key = str(path.resolve())
+        cached = self.digests.get(key)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            self.digests.move_to_end(key)
+            return cached[2]
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            while chunk := f.read(HASH_CHUNK):
+                h.update(chunk)
+        digest = h.hexdigest()
+        self.digests[key] = (st.st_size, st.st_mtime_ns, digest)
+        if len(self.digests) > MEDIA_CACHE_SIZE:
+            self.digests.popitem(last=False)
+        return digest
+
+    def known(self, kind: str, path: Path) -> bool:
+        """Есть ли file_id для файла, не читая его (только по размеру и mtime)."""
+        st = path.stat()
+        cached = self.digests.get(str(path.resolve()))
+        return bool(cached and cached[:2] == (st.st_size, st.st_mtime_ns)
+                    and f"{kind}:{cached[2]}" in self.file_ids)
+
+    def get(self, kind: str, digest: str) -> Optional[str]:
+        key = f"{kind}:{digest}"
+        file_id = self.file_ids.get(key)
+        if file_id:
+            self.file_ids.move_to_end(key)
+        return file_id
+
+    def put(self, kind: str, digest: str, file_id: str):
+        self.file_ids[f"{kind}:{digest}"] = file_id
+        if len(self.file_ids) > MEDIA_CACHE_SIZE:
+            self.file_ids.popitem(last=False)
+        self.save()
+
+    def drop(self, kind: str, digest: str):
+        if self.file_ids.pop(f"{kind}:{digest}", None):
+            self.save()
+
+media_cache = MediaCache(MEDIA_CACHE_PATH)
+
+def _sent_file_id(message: Message, kind: str) -> Optional[str]:
+    if kind == 'photo' and message.photo:
+        return message.photo[-1].file_id
+    media = getattr(message, kind, None) or message.document
+    return media.file_id if media else None
+
+async def send_cached(kind: str, chat_id: int, path: Path, upload=None, **kwargs) -> Message:
+    """Отправляет файл как photo/video/document. Повторная отправка того же содержимого
+    идёт по file_id без загрузки байтов. upload — свой InputFile для первой загрузки."""
+    send = {'photo': bot.send_photo, 'video': bot.send_video, 'document': bot.send_document}[kind]
+    digest = await asyncio.to_thread(media_cache.digest, path)
+    file_id = media_cache.get(kind, digest)
+    if file_id:
+        try:
+            return await send(chat_id, file_id, **kwargs)
+        except aiogram.exceptions.TelegramBadRequest as e:
+            logging.warning(f"file_id из кэша не принят ({e}), загружаю {path.name} заново.")
+            media_cache.drop(kind, digest)
+    message = await send(chat_id, upload or input_file(path), **kwargs)
+    file_id = _sent_file_id(message, kind)
+    if file_id:
+        media_cache.put(kind, digest, file_id)
+    return message
+
+# ==========================
+# БЫСТРЫЙ ОТВЕТ НА CALLBACK
+# ==========================
+
+class CallbackAckMiddleware(BaseMiddleware):
+    """Гарантирует ответ на callback-запрос в пределах бюджета задержки.
+
+    Хендлер запускается как обычно; если за CALLBACK_ACK_BUDGET_MS он сам не
+    вызвал callback.answer(), мидлварь отвечает за него (спиннер на телефоне
+    пропадает сразу). Поздние callback.answer() перехватываются на уровне
+    сессии бота: текст уходит сообщением, пустой ответ отбрасывается. Ошибки
+    хендлера после подтверждения присылаются сообщением.
+
+    Хендлер может попросить сообщение о ходе работы флагом
+    flags={'progress': 'Текст…'} — оно появится, если работа дольше бюджета,
+    и удалится по завершении.
+    """
+
+    def __init__(self, budget_ms: int):
+        self.budget = budget_ms / 1000
+        self.answered: set[str] = set()
+        self.acked: dict[str, int] = {}  # id запроса → чат для поздних ответов
+        self._own_acks: set[int] = set()
+
+    async def __call__(self, handler, event: CallbackQuery, data: dict):
+        task = asyncio.create_task(handler(event, data))
+        try:
+            done, _ = await asyncio.wait({task}, timeout=self.budget)
+            progress = None
+            if not done:
+                if event.id not in self.answered:
+                    await self._ack(event)
+                text = get_flag(data, 'progress')
+                if text:
+                    progress = await bot.send_message(event.from_user.id, f"⏳ {text}")
+            try:
+                return await task
+            except Exception as e:
+                if event.id in self.acked:
+                    await bot.send_message(event.from_user.id, f"Ошибка: {e}")
+                raise
+            finally:
+                if progress:
+                    try:
+                        await progress.delete()
+                    except aiogram.exceptions.TelegramBadRequest:
+                        pass
+                # Хендлер уложился в бюджет, но так и не ответил — отвечаем за него
+                if event.id not in self.answered and event.id not in self.acked:
+                    await self._ack(event)
+        finally:
+            self.answered.discard(event.id)
+            self.acked.pop(event.id, None)
+
+    async def _ack(self, event: CallbackQuery):
+        method = AnswerCallbackQuery(callback_query_id=event.id)
+        self._own_acks.add(id(method))
+        # Отмечаем заранее: callback.answer() хендлера во время этого запроса уйдёт сообщением
+        self.acked[event.id] = event.from_user.id
+        try:
+            await bot(method)
+        except aiogram.exceptions.TelegramBadRequest as e:
+            self.acked.pop(event.id, None)
+            logging.warning(f"Не удалось подтвердить callback: {e}")
+        finally:
+            self._own_acks.discard(id(method))
+
+    async def request_middleware(self, make_request, bot_: Bot, method):
+        """Мидлварь сессии: перехватывает ответы на уже подтверждённые запросы."""
+        if isinstance(method, AnswerCallbackQuery) and id(method) not in self._own_acks:
+            chat_id = self.acked.get(method.callback_query_id)
+            if chat_id is not None:
+                if method.text:
+                    await bot_.send_message(chat_id, method.text)
+                # Как настоящий make_request — уже распакованный результат метода
+                return True
+            self.answered.add(method.callback_query_id)
+        return await make_request(bot_, method)
+
+callback_ack = CallbackAckMiddleware(CALLBACK_ACK_BUDGET_MS)
+dp.callback_query.middleware(callback_ack)
+bot.session.middleware(callback_ack.request_middleware)
+
 # ==========================
 # ДАННЫЕ ПРИЛОЖЕНИЙ / КОМБО
 # ==========================
@@ -120,6 +487,207 @@ combos_data = load_data('combos.json')
 def has_access(message: types.Message):
     return message.from_user.id == USER_ID
 
+# ==========================
+# ПОИСКОВЫЙ ИНДЕКС (ИНЛАЙН / /run)
+# ==========================
+
+def _normalize(text: str) -> str:
+    return re.sub(r'\s+', ' ', str(text).casefold().replace('ё', 'е')).strip()
+
+def _trigrams(text: str) -> set[str]:
+    """Триграммы по словам, с пробелом в начале — чтобы начало слова весило больше."""
+    grams = set()
+    for word in text.split():
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+class LaunchIndex:
+    """Предрасчитанный индекс по имени и ключу приложений/комбинаций.
+
+    Триграммы дают устойчивость к опечаткам, префиксы слов — быстрый ответ на
+    первые 1–2 буквы. Индекс обновляется инкрементально: пересчитываются только
+    добавленные, удалённые и изменённые записи.
+    """
+
+    PREFIX_LEN = 3
+    USAGE_HALF_LIFE = 7 * 24 * 3600
+
+    def __init__(self):
+        self.entries: dict[int, tuple[str, str, str, str]] = {}  # id → (kind, key, name, text)
+        self.ids: dict[tuple[str, str], int] = {}
+        self.grams: dict[str, set[int]] = {}
+        self.prefixes: dict[str, set[int]] = {}
+        # Словарь слов: запросы из нескольких слов сравниваются со словами, а не со всеми записями
+        self.words: dict[str, set[int]] = {}          # слово → id записей
+        self.word_grams: dict[str, set[str]] = {}     # триграмма → слова
+        self.word_prefixes: dict[str, set[str]] = {}  # префикс → слова
+        self.usage: dict[tuple[str, str], tuple[float, float]] = {}  # (kind, key) → (score, ts)
+        self._next_id = 0
+
+    def _keys_of(self, text: str):
+        for word in text.split():
+            for n in range(1, min(len(word), self.PREFIX_LEN) + 1):
+                yield word[:n]
+
+    def _add(self, kind: str, key: str, name: str):
+        text = _normalize(f"{name} {key.replace('_', ' ')}")
+        entry_id = self._next_id
+        self._next_id += 1
+        self.entries[entry_id] = (kind, key, name, text)
+        self.ids[(kind, key)] = entry_id
+        for g in _trigrams(text):
+            self.grams.setdefault(g, set()).add(entry_id)
+        for p in self._keys_of(text):
+            self.prefixes.setdefault(p, set()).add(entry_id)
+        for word in set(text.split()):
+            if word not in self.words:
+                self.words[word] = set()
+                for g in _trigrams(word):
+                    self.word_grams.setdefault(g, set()).add(word)
+                for p in self._keys_of(word):
+                    self.word_prefixes.setdefault(p, set()).add(word)
+            self.words[word].add(entry_id)
+
+    def _remove(self, kind: str, key: str):
+        entry_id = self.ids.pop((kind, key))
+        text = self.entries.pop(entry_id)[3]
+        for g in _trigrams(text):
+            bucket = self.grams.get(g)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self.grams[g]
+        for p in self._keys_of(text):
+            bucket = self.prefixes.get(p)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self.prefixes[p]
+        for word in set(text.split()):
+            bucket = self.words[word]
+            bucket.discard(entry_id)
+            if bucket:
+                continue
+            del self.words[word]
+            for index, keys in ((self.word_grams, _trigrams(word)), (self.word_prefixes, self._keys_of(word))):
+                for k in keys:
+                    index[k].discard(word)
+                    if not index[k]:
+                        del index[k]
+
+    def sync(self, items: list[tuple[str, str, str]]):
+        """Приводит индекс к списку (kind, key, name), трогая только изменившиеся записи."""
+        wanted = {(kind, key): name for kind, key, name in items}
+        for ident in list(self.ids):
+            if ident not in wanted or self.entries[self.ids[ident]][2] != wanted[ident]:
+                self._remove(*ident)
+        for (kind, key), name in wanted.items():
+            if (kind, key) not in self.ids:
+                self._add(kind, key, name)
+
+    def touch(self, kind: str, key: str):
+        """Учитывает использование записи — недавние поднимаются выше в выдаче."""
+        now = time.time()
+        score, ts = self.usage.get((kind, key), (0.0, now))
+        score = score * 0.5 ** ((now - ts) / self.USAGE_HALF_LIFE) + 1.0
+        self.usage[(kind, key)] = (score, now)
+
+    def _usage_bonus(self, kind: str, key: str, now: float) -> float:
+        score, ts = self.usage.get((kind, key), (0.0, now))
+        score *= 0.5 ** ((now - ts) / self.USAGE_HALF_LIFE)
+        return score / (score + 3.0)
+
+    def exact(self, query: str) -> list[tuple[str, str, str]]:
+        """Записи, у которых ключ или название совпадают с запросом без учёта регистра."""
+        q = query.strip().casefold()
+        return [(kind, key, name) for kind, key, name, _ in self.entries.values()
+                if q and (key.casefold() == q or name.casefold() == q)]
+
+    def search(self, query: str, limit: int = 10) -> list[tuple[str, str, str]]:
+        q = _normalize(query)
+        now = time.time()
+        if not q:
+            # Пустой запрос — недавно использованные, затем всё остальное по порядку
+            recent = heapq.nlargest(limit, (i for i in self.usage if i in self.ids),
+                                    key=lambda i: self._usage_bonus(*i, now))
+            picked = [self.ids[i] for i in recent]
+            seen = set(picked)
+            picked += islice((e for e in self.entries if e not in seen), limit - len(picked))
+            return [self.entries[e][:3] for e in picked]
+
+        words = q.split()
+        q_grams = _trigrams(q)
+        # Короткие слова дополнительно ищем по префиксу: «т» → telegram
+        short = [w for w in words if len(w) <= self.PREFIX_LEN]
+        total = len(q_grams) + len(short)
+        # Допускаем опечатки: достаточно 40% совпавших триграмм
+        threshold = max(1, ceil(total * 0.4))
+        if len(words) > 1:
+            top = self._count_by_words(words, limit)
+        else:
+            counts = Counter(chain.from_iterable(self.grams.get(g, ()) for g in q_grams))
+            counts.update(chain.from_iterable(self.prefixes.get(w, ()) for w in short))
+            top = counts.most_common(limit * 5)
+
+        ranked = []
+        for entry_id, n in top:
+            if n < threshold:
+                break
+            kind, key, name, text = self.entries[entry_id]
+            score = n / total + self._usage_bonus(kind, key, now)
+            if key.casefold() == q or text.startswith(q):
+                score += 1.0
+            ranked.append((score, kind, key, name))
+        ranked.sort(key=lambda r: -r[0])
+        return [(kind, key, name) for _, kind, key, name in ranked[:limit]]
+
+    def _count_by_words(self, words: list[str], limit: int) -> list[tuple[int, int]]:
+        """Совпадения для запроса из нескольких слов.
+
+        Каждое слово запроса сравнивается со словарём, а не со всеми записями: запись
+        получает по нему совпадения лучшего из своих слов (слова словаря, совпавшие
+        меньше чем на 40%, не учитываются). Считаются не все записи: сначала те, где
+        нашлись все слова запроса (пересечение множеств), затем все, кроме одного, и
+        т. д., пока кандидатов не хватит на limit; недавно использованные — всегда.
+        """
+        per_word = []
+        for word in dict.fromkeys(words):
+            grams = _trigrams(word)
+            matched = Counter(chain.from_iterable(self.word_grams.get(g, ()) for g in grams))
+            size = len(grams)
+            if len(word) <= self.PREFIX_LEN:
+                matched.update(self.word_prefixes.get(word, ()))
+                size += 1
+            need = max(1, ceil(size * 0.4))
+            best: dict[int, int] = {}
+            for known, hits in sorted(matched.items(), key=itemgetter(1)):
+                if hits >= need:
+                    best.update(dict.fromkeys(self.words[known], hits))
+            if best:
+                per_word.append(best)
+        found = [set(best) for best in per_word]
+        candidates = {self.ids[i] for i in self.usage if i in self.ids}
+        candidates = {e for e in candidates if any(e in f for f in found)}
+        for matched_words in range(len(found), 0, -1):
+            for group in combinations(found, matched_words):
+                candidates |= set.intersection(*group)
+            if len(candidates) >= limit:
+                break
+        scored = [(sum(best.get(e, 0) for best in per_word), e) for e in candidates]
+        return [(e, total) for total, e in heapq.nlargest(limit * 5, scored)]
+
+launch_index = LaunchIndex()
+
+def refresh_launch_index():
+    launch_index.sync(
+        [('app', a['key'], a.get('name', a['key'])) for a in apps_data if a.get('show_in_menu', True)]
+        + [('combo', c['key'], c.get('name', c['key'])) for c in combos_data if c.get('show_in_menu', True)]
+    )
+
+refresh_launch_index()
+
 # ==========================
 # КЛАВИАТУРЫ
 # ==========================
@@ -142,6 +710,7 @@ def get_controls_keyboard():
     builder.button(text="➡️", callback_data="media_arrow_right")
     builder.button(text="⌨️", callback_data="media_switch_reply")
     builder.button(text="⎵", callback_data="media_space")
+    builder.button(text="🎚", callback_data="vol_new")
     builder.button(text="🔉", callback_data="media_volume_down")
     builder.button(text="🔇", callback_data="media_volume_mute")
     builder.button(text="🔊", callback_data="media_volume_up")
@@ -149,7 +718,9 @@ def get_controls_keyboard():
     builder.button(text="⏮", callback_data="media_prev")
     builder.button(text="⏯", callback_data="media_play_pause")
     builder.button(text="⏭", callback_data="media_next")
-    builder.adjust(3, 3, 2, 3, 3)
+    builder.adjust(3, 3, 3, 3, 3)
+    if WEBAPP_URL:
+        builder.row(InlineKeyboardButton(text="🖱 Тачпад", web_app=WebAppInfo(url=WEBAPP_URL)))
     return builder.as_markup()
 
 def get_controls_reply_keyboard():
@@ -232,36 +803,12 @@ async def process_controls(callback: CallbackQuery):
     action = callback.data[len("media_"):]
     if action == "switch_reply":
         return
+    control = CONTROL_ACTIONS.get(action)
+    if control is None:
+        await callback.answer("Неизвестная команда.", show_alert=True)
+        return
     try:
-        if action == "arrow_left":
-            keyboard.send('left')
-        elif action == "arrow_right":
-            keyboard.send('right')
-        elif action == "arrow_up":
-            keyboard.send('up')
-        elif action == "arrow_down":
-            keyboard.send('down')
-        elif action == "page_up":
-            keyboard.send('page up')
-        elif action == "page_down":
-            keyboard.send('page down')
-        elif action == "space":
-            keyboard.send('space')
-        elif action == "volume_up":
-            volume_up()
-        elif action == "volume_down":
-            volume_down()
-        elif action == "volume_mute":
-            volume_mute()
-        elif action == "prev":
-            media_prev()
-        elif action == "play_pause":
-            media_play_pause()
-        elif action == "next":
-            media_next()
-        else:
-            await callback.answer("Неизвестная команда.", show_alert=True)
-            return
+        control()
         await callback.answer()
     except Exception as e:
         await callback.answer(f"Ошибка: {e}", show_alert=True)
@@ -302,6 +849,7 @@ async def reload_data(message: Message):
     global apps_data, combos_data
     apps_data = load_data('apps.json')
     combos_data = load_data('combos.json')
+    refresh_launch_index()
     toggle_state.clear()
     await message.answer("Данные из JSON файлов успешно обновлены.")
 
@@ -313,7 +861,7 @@ async def edit_apps(message: Message):
         await message.answer("У вас нет доступа к редактированию файлов.")
         return
     try:
-        await message.answer_document(types.FSInputFile(APPS_JSON_PATH), caption="Файл apps.json для редактирования")
+        await send_cached('document', message.chat.id, APPS_JSON_PATH, caption="Файл apps.json для редактирования")
     except Exception as e:
         await message.answer(f"Ошибка отправки файла: {e}")
 
@@ -323,7 +871,7 @@ async def edit_combos(message: Message):
         await message.answer("У вас нет доступа к редактированию файлов.")
         return
     try:
-        await message.answer_document(types.FSInputFile(COMBOS_JSON_PATH), caption="Файл combos.json для редактирования")
+        await send_cached('document', message.chat.id, COMBOS_JSON_PATH, caption="Файл combos.json для редактирования")
     except Exception as e:
         await message.answer(f"Ошибка отправки файла: {e}")
 
@@ -362,6 +910,7 @@ async def handle_json_upload(message: Message):
                 apps_data = new_data
             else:
                 combos_data = new_data
+            refresh_launch_index()
             await message.answer(f"Файл {filename.name} успешно обновлён!")
         except json.JSONDecodeError as e:
             await message.answer(f"Ошибка в JSON файле: {e}")
@@ -452,30 +1001,50 @@ def _resolve_path(p: str) -> str:
     pp = Path(p)
     return str(pp if pp.is_absolute() else (APP_DIR / pp))
 
-def _open_with_shell(path: str):
-    os.startfile(path)
+SEE_MASK_NOCLOSEPROCESS = 0x00000040
+SW_SHOWNORMAL = 1
 
-def _run_exe(path: str, args: List[str]):
-    subprocess.Popen([path] + args, shell=False)
+class SHELLEXECUTEINFOW(ctypes.Structure):
+    _fields_ = [('cbSize', wintypes.DWORD), ('fMask', wintypes.ULONG), ('hwnd', wintypes.HWND),
+                ('lpVerb', wintypes.LPCWSTR), ('lpFile', wintypes.LPCWSTR), ('lpParameters', wintypes.LPCWSTR),
+                ('lpDirectory', wintypes.LPCWSTR), ('nShow', ctypes.c_int), ('hInstApp', wintypes.HINSTANCE),
+                ('lpIDList', ctypes.c_void_p), ('lpClass', wintypes.LPCWSTR), ('hkeyClass', wintypes.HKEY),
+                ('dwHotKey', wintypes.DWORD), ('hIconOrMonitor', wintypes.HANDLE), ('hProcess', wintypes.HANDLE)]
 
-@dp.callback_query(F.data.startswith("app_toggle_"))
-async def toggle_app(callback: CallbackQuery):
-    key = callback.data[len("app_toggle_"):]
-    app_info = next((app for app in apps_data if app['key'] == key and app.get('show_in_menu', True)), None)
-    if not app_info:
-        await callback.answer("Приложение не найдено!", show_alert=True)
-        return
+def _open_with_shell(path: str):
+    """Как os.startfile, но с дескриптором запущенного процесса: он наследует от бота
+    пониженный приоритет и ядра (/lowimpact) — их нужно вернуть."""
+    shell32 = ctypes.WinDLL('shell32', use_last_error=True)
+    kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+    shell32.ShellExecuteExW.argtypes = [ctypes.POINTER(SHELLEXECUTEINFOW)]
+    kernel32.GetProcessId.argtypes = [wintypes.HANDLE]
+    kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+    info = SHELLEXECUTEINFOW(cbSize=ctypes.sizeof(SHELLEXECUTEINFOW), fMask=SEE_MASK_NOCLOSEPROCESS,
+                             lpFile=path, nShow=SW_SHOWNORMAL)
+    if not shell32.ShellExecuteExW(ctypes.byref(info)):
+        raise ctypes.WinError(ctypes.get_last_error())
+    # URL и документы, открытые в уже работающем приложении (Steam, браузер), процесса не дают
+    if info.hProcess:
+        try:
+            low_impact.release_child(kernel32.GetProcessId(info.hProcess) or None)
+        finally:
+            kernel32.CloseHandle(info.hProcess)
 
+def _run_exe(path: str, args: List[str]) -> int:
+    pid = subprocess.Popen([path] + args, shell=False).pid
+    low_impact.release_child(pid)
+    return pid
+
+def _start_app(app_info) -> tuple[bool, Optional[int], Optional[str]]:
+    """Запускает приложение. Возвращает (запущено ли новое, pid или None, уведомление)."""
     # 0) Steam по appid
     steam_appid = app_info.get('steam_appid')
     if steam_appid:
         try:
             _open_with_shell(f"steam://rungameid/{steam_appid}")
-            await callback.answer()
-            return
+            return True, None, None
         except Exception as e:
-            await callback.answer(f"Steam ошибка: {e}", show_alert=True)
-            return
+            raise RuntimeError(f"Steam ошибка: {e}") from e
 
     path = str(app_info.get('path', '')).strip()
     args = _as_list(app_info.get('args')) or _as_list(app_info.get('arg'))
@@ -485,30 +1054,24 @@ async def toggle_app(callback: CallbackQuery):
     if _is_url(path):
         try:
             _open_with_shell(path)
-            await callback.answer()
-            return
+            return True, None, None
         except Exception as e:
             # Спец-fallback: Telegram не установлен → открыть сайт установки
             if path.lower().startswith("tg://"):
                 try:
                     _open_with_shell("https://desktop.telegram.org")
-                    await callback.answer("Telegram не найден — открыл страницу установки.")
-                    return
+                    return False, None, "Telegram не найден — открыл страницу установки."
                 except Exception as e2:
-                    await callback.answer(f"Ошибка открытия Telegram: {e2}", show_alert=True)
-                    return
-            await callback.answer(f"Ошибка URL: {e}", show_alert=True)
-            return
+                    raise RuntimeError(f"Ошибка открытия Telegram: {e2}") from e2
+            raise RuntimeError(f"Ошибка URL: {e}") from e
 
     # 2) .url ярлык?
     if path.lower().endswith(".url"):
         try:
             _open_with_shell(_resolve_path(path))
-            await callback.answer()
-            return
+            return True, None, None
         except Exception as e:
-            await callback.answer(f"Ошибка ярлыка: {e}", show_alert=True)
-            return
+            raise RuntimeError(f"Ошибка ярлыка: {e}") from e
 
     # 3) Обычный EXE/файл
     resolved = _resolve_path(path)
@@ -516,27 +1079,72 @@ async def toggle_app(callback: CallbackQuery):
     if is_app == 'n':
         try:
             if resolved.lower().endswith(".exe") and args:
-                _run_exe(resolved, args)
-            else:
-                _open_with_shell(resolved)
-            await callback.answer()
-            return
+                return True, _run_exe(resolved, args), None
+            _open_with_shell(resolved)
+            return True, None, None
         except Exception as e:
-            await callback.answer(f"Ошибка запуска: {e}", show_alert=True)
-            return
+            raise RuntimeError(f"Ошибка запуска: {e}") from e
+
+    # is_app == 'y' → поднять окно, если запущено, иначе — запустить
+    try:
+        if activate_app_window(app_info):
+            return False, None, None
+        if resolved.lower().endswith(".exe"):
+            return True, _run_exe(resolved, args), None
+        _open_with_shell(resolved)
+    except Exception:
+        _open_with_shell(resolved)
+    return True, None, None
+
+def launch_app(app_info, chat_id: Optional[int] = None) -> Optional[str]:
+    """Запускает приложение из apps.json без привязки к callback.
+
+    Возвращает текст уведомления для пользователя (или None), при ошибке
+    бросает RuntimeError с понятным сообщением. Если передан chat_id, запуск
+    отслеживается до появления окна и результат приходит в этот чат.
+    """
+    launch_index.touch('app', app_info['key'])
+    started = time.monotonic()
+    launched, pid, notice = _start_app(app_info)
+    if launched and chat_id is not None:
+        launch_tracker.track(app_info, chat_id, started, pid)
+    return notice
+
+def _is_toggle_app(app_info) -> bool:
+    """Приложение с переключением показать/свернуть (is_app: y, обычный EXE/файл)."""
+    if app_info.get('steam_appid'):
+        return False
+    path = str(app_info.get('path', '')).strip()
+    if _is_url(path) or path.lower().endswith(".url"):
+        return False
+    return str(app_info.get('is_app', 'y')).lower() != 'n'
+
+@dp.callback_query(F.data.startswith("app_toggle_"))
+async def toggle_app(callback: CallbackQuery):
+    key = callback.data[len("app_toggle_"):]
+    app_info = next((app for app in apps_data if app['key'] == key and app.get('show_in_menu', True)), None)
+    if not app_info:
+        await callback.answer("Приложение не найдено!", show_alert=True)
+        return
+
+    if app_info.get('type') == 'scene':
+        await callback.answer()
+        await run_scene(app_info, callback.from_user.id)
+        return
+
+    if not _is_toggle_app(app_info):
+        try:
+            notice = launch_app(app_info, callback.from_user.id)
+            await callback.answer(notice)
+        except RuntimeError as e:
+            await callback.answer(str(e), show_alert=True)
+        return
 
     # is_app == 'y' → показать/свернуть (если запущено), иначе — запустить
     state = toggle_state.get(key, 'minimized')
     try:
         if state == 'minimized':
-            try:
-                if not activate_app_window(app_info):
-                    if resolved.lower().endswith(".exe"):
-                        _run_exe(resolved, args)
-                    else:
-                        _open_with_shell(resolved)
-            except Exception:
-                _open_with_shell(resolved)
+            launch_app(app_info, callback.from_user.id)
             toggle_state[key] = 'shown'
             await callback.answer()
         else:
@@ -549,6 +1157,8 @@ async def toggle_app(callback: CallbackQuery):
     except Exception as e:
         await callback.answer(f"Ошибка: {e}", show_alert=True)
 
+    if callback.message is None:
+        return
     try:
         await callback.message.edit_reply_markup(reply_markup=get_apps_keyboard(user_data['apps_page']))
     except aiogram.exceptions.TelegramBadRequest as e:
@@ -556,7 +1166,7 @@ async def toggle_app(callback: CallbackQuery):
             logging.warning(f"TelegramBadRequest при редактировании клавиатуры приложений: {e}")
 
 def activate_app_window(app_info):
-    exe_name = app_info.get('exe') or app_info.get('path', '').split('\\')[-1]
+    exe_name = _app_exe_name(app_info) or app_info.get('path', '').split('\\')[-1]
     pids = [p.info['pid'] for p in psutil.process_iter(['pid', 'name'])
             if p.info['name'] and exe_name.lower() in p.info['name'].lower()]
     if not pids:
@@ -576,7 +1186,7 @@ def activate_app_window(app_info):
     return True
 
 def minimize_app_window(app_info):
-    exe_name = app_info.get('exe') or app_info.get('path', '').split('\\')[-1]
+    exe_name = _app_exe_name(app_info) or app_info.get('path', '').split('\\')[-1]
     pids = [p.info['pid'] for p in psutil.process_iter(['pid', 'name'])
             if p.info['name'] and exe_name.lower() in p.info['name'].lower()]
     if not pids:
@@ -591,6 +1201,1046 @@ def minimize_app_window(app_info):
         win32gui.EnumWindows(callback, None)
     return True
 
+# ==========================
+# ПОИСК УСТАНОВЛЕННЫХ ПРОГРАММ (ПУСК / РЕЕСТР / STEAM)
+# ==========================
+
+DISCOVERY_PATH = APP_DIR / 'discovered_apps.json'
+DISCOVERY_PAGE = 10
+APP_PATHS_KEY = r"SOFTWARE\Microsoft\Windows\CurrentVersion\App Paths"
+STEAM_EXE_DEPTH = 4
+# Служебные exe, которые не стоит предлагать как приложение
+EXE_SKIP = re.compile(r'unins|setup|install|update|crash|report|redist|dxwebsetup|helper|elevat', re.I)
+STEAM_SKIP = re.compile(r'redistributable|steam linux runtime|proton|steamvr', re.I)
+SOURCE_ICONS = {'steam': "🎮", 'start': "📌", 'registry': "🧩"}
+SOURCE_PRIORITY = {'steam': 0, 'start': 1, 'registry': 2}
+
+def _start_menu_dirs() -> list[Path]:
+    dirs = []
+    for env in ('APPDATA', 'PROGRAMDATA'):
+        base = os.environ.get(env)
+        if base:
+            d = Path(base) / 'Microsoft' / 'Windows' / 'Start Menu' / 'Programs'
+            if d.is_dir():
+                dirs.append(d)
+    return dirs
+
+def _vdf_values(text: str, key: str) -> list[str]:
+    """Значения ключа из VDF/ACF Steam (плоский поиск "key" "value")."""
+    return [v.replace('\\\\', '\\') for v in re.findall(rf'"{key}"\s+"([^"]*)"', text, re.I)]
+
+def _steam_libraries() -> list[Path]:
+    try:
+        import winreg
+        with winreg.OpenKey(winreg.HKEY_CURRENT_USER, r"Software\Valve\Steam") as key:
+            steam = Path(winreg.QueryValueEx(key, "SteamPath")[0])
+    except OSError:
+        return []
+    libraries = [steam]
+    try:
+        text = (steam / 'steamapps' / 'libraryfolders.vdf').read_text(encoding='utf-8', errors='replace')
+        libraries += [Path(p) for p in _vdf_values(text, 'path')]
+    except OSError:
+        pass
+    unique = []
+    for lib in libraries:
+        if lib.resolve() not in [u.resolve() for u in unique]:
+            unique.append(lib)
+    return unique
+
+def _guess_game_exe(root: Path) -> Optional[str]:
+    """Самый крупный exe в папке игры (не глубже STEAM_EXE_DEPTH), кроме служебных."""
+    best: tuple[int, str] | None = None
+    stack = [(root, 0)]
+    while stack:
+        d, depth = stack.pop()
+        try:
+            items = list(os.scandir(d))
+        except OSError:
+            continue
+        for item in items:
+            if item.is_dir(follow_symlinks=False):
+                if depth < STEAM_EXE_DEPTH and not item.name.startswith(('_', '.')) and 'redist' not in item.name.lower():
+                    stack.append((Path(item.path), depth + 1))
+            elif item.name.lower().endswith('.exe') and not EXE_SKIP.search(item.name):
+                try:
+                    size = item.stat().st_size
+                except OSError:
+                    continue
+                if best is None or size > best[0]:
+                    best = (size, item.name.lower())
+    return best[1] if best else None
+
+def _entry_id(source_path: str) -> str:
+    return hashlib.sha1(source_path.lower().encode('utf-8')).hexdigest()[:10]
+
+class AppDiscovery:
+    """Индекс установленных программ: ярлыки меню «Пуск», App Paths из реестра и игры Steam.
+
+    В discovered_apps.json для каждой папки, ключа реестра и манифеста Steam хранится
+    его отметка времени и найденные записи. При пересканировании заново читается только
+    изменившееся: нетронутая папка «Пуск» стоит одного stat(), манифест — тоже.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.sources: dict[str, dict] = {}   # источник → {'stamp', 'entries', 'subdirs'}
+        self.entries: dict[str, dict] = {}   # id → запись
+        self.by_appid: dict[str, dict] = {}
+        self.by_path: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.sources = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logging.warning(f"Кэш программ не прочитан ({e}), будет пересобран.")
+        self._rebuild()
+
+    def save(self):
+        try:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(self.sources, f, ensure_ascii=False)
+        except OSError as e:
+            logging.error(f"Ошибка сохранения {self.path.name}: {e}")
+
+    def rescan(self) -> Counter:
+        """Обновляет индекс (блокирующий вызов — запускать в потоке). Возвращает счётчики checked/read."""
+        with self._lock:
+            stats = Counter()
+            new: dict[str, dict] = {}
+            try:
+                import pythoncom
+                import win32com.client
+                pythoncom.CoInitialize()
+                try:
+                    shell = win32com.client.Dispatch("WScript.Shell")
+                    for root in _start_menu_dirs():
+                        self._scan_shortcuts(root, shell, new, stats)
+                finally:
+                    pythoncom.CoUninitialize()
+            except Exception as e:
+                logging.warning(f"Ярлыки меню «Пуск» не прочитаны: {e}")
+            self._scan_app_paths(new, stats)
+            self._scan_steam(new, stats)
+            self.sources = new
+            self._rebuild()
+            self.save()
+            return stats
+
+    def _reuse(self, source: str, stamp, new: dict, stats: Counter) -> bool:
+        stats['checked'] += 1
+        cached = self.sources.get(source)
+        if cached and cached['stamp'] == stamp:
+            new[source] = cached
+            return True
+        stats['read'] += 1
+        return False
+
+    def _scan_shortcuts(self, root: Path, shell, new: dict, stats: Counter):
+        stack = [root]
+        while stack:
+            d = stack.pop()
+            source = f"dir:{d}"
+            try:
+                stamp = d.stat().st_mtime_ns
+            except OSError:
+                continue
+            if not self._reuse(source, stamp, new, stats):
+                subdirs, entries = [], []
+                try:
+                    items = list(os.scandir(d))
+                except OSError:
+                    continue
+                for item in items:
+                    if item.is_dir():
+                        subdirs.append(item.name)
+                    elif item.name.lower().endswith('.lnk') and not EXE_SKIP.search(item.name):
+                        try:
+                            target = shell.CreateShortCut(item.path).TargetPath
+                        except Exception:
+                            continue
+                        if target.lower().endswith('.exe') and not EXE_SKIP.search(Path(target).name):
+                            entries.append({'name': Path(item.name).stem, 'path': target, 'exe': Path(target).name.lower(),
+                                            'source': 'start', 'lnk': item.path})
+                new[source] = {'stamp': stamp, 'subdirs': subdirs, 'entries': entries}
+            stack.extend(d / name for name in new[source]['subdirs'])
+
+    def _scan_app_paths(self, new: dict, stats: Counter):
+        import winreg
+        for hive, hive_name in ((winreg.HKEY_LOCAL_MACHINE, 'HKLM'), (winreg.HKEY_CURRENT_USER, 'HKCU')):
+            try:
+                key = winreg.OpenKey(hive, APP_PATHS_KEY)
+            except OSError:
+                continue
+            with key:
+                count, _, modified = winreg.QueryInfoKey(key)
+                source = f"reg:{hive_name}"
+                if self._reuse(source, [modified, count], new, stats):
+                    continue
+                entries = []
+                for i in range(count):
+                    name = winreg.EnumKey(key, i)
+                    try:
+                        target = os.path.expandvars(winreg.QueryValue(key, name)).strip().strip('"')
+                    except OSError:
+                        continue
+                    if target.lower().endswith('.exe') and not EXE_SKIP.search(name):
+                        entries.append({'name': Path(name).stem, 'path': target, 'exe': Path(target).name.lower(),
+                                        'source': 'registry'})
+                new[source] = {'stamp': [modified, count], 'entries': entries}
+
+    def _scan_steam(self, new: dict, stats: Counter):
+        for lib in _steam_libraries():
+            apps_dir = lib / 'steamapps'
+            for manifest in apps_dir.glob('appmanifest_*.acf'):
+                source = f"steam:{manifest}"
+                try:
+                    stamp = manifest.stat().st_mtime_ns
+                except OSError:
+                    continue
+                if self._reuse(source, stamp, new, stats):
+                    continue
+                entries = []
+                try:
+                    text = manifest.read_text(encoding='utf-8', errors='replace')
+                    appid, name, installdir = (_vdf_values(text, k)[0] for k in ('appid', 'name', 'installdir'))
+                except (OSError, IndexError):
+                    appid = None
+                if appid and not STEAM_SKIP.search(name):
+                    entries.append({'name': name, 'path': f"steam://rungameid/{appid}", 'steam_appid': appid,
+                                    'exe': _guess_game_exe(apps_dir / 'common' / installdir), 'source': 'steam'})
+                new[source] = {'stamp': stamp, 'entries': entries}
+
+    def _rebuild(self):
+        found = [(source, e) for source, data in self.sources.items() for e in data.get('entries', [])]
+        found.sort(key=lambda item: SOURCE_PRIORITY.get(item[1]['source'], 9))
+        entries, seen_exe = {}, set()
+        for source, entry in found:
+            exe = entry.get('exe')
+            if exe and exe in seen_exe:
+                continue  # одна программа из нескольких источников — берём приоритетный
+            if exe:
+                seen_exe.add(exe)
+            entries[_entry_id(entry.get('lnk') or entry['path'])] = entry
+        entries = dict(sorted(entries.items(), key=lambda item: item[1]['name'].lower()))
+        by_path = {}
+        for e in entries.values():
+            for p in (e['path'], e.get('lnk')):
+                if p:
+                    by_path[p.lower()] = e
+        # Индекс читается из цикла asyncio во время пересканирования — подменяем целиком
+        self.by_appid = {str(e['steam_appid']): e for e in entries.values() if e.get('steam_appid')}
+        self.by_path = by_path
+        self.entries = entries
+
+    def lookup(self, app_info) -> Optional[dict]:
+        appid = app_info.get('steam_appid')
+        path = str(app_info.get('path', '')).strip()
+        if not appid and path.lower().startswith('steam://rungameid/'):
+            appid = path.rsplit('/', 1)[-1]
+        if appid:
+            return self.by_appid.get(str(appid))
+        return self.by_path.get(path.lower()) if path else None
+
+    def exe_for(self, app_info) -> Optional[str]:
+        entry = self.lookup(app_info)
+        return entry.get('exe') if entry else None
+
+    def missing(self) -> list[tuple[str, dict]]:
+        """Найденные программы, которых ещё нет в apps.json."""
+        known_exe = {_app_exe_name(a) for a in apps_data} - {None}
+        known = {id(e) for e in map(self.lookup, apps_data) if e}
+        return [(i, e) for i, e in self.entries.items()
+                if id(e) not in known and not (e.get('exe') and e['exe'] in known_exe)]
+
+app_discovery = AppDiscovery(DISCOVERY_PATH)
+
+def save_apps():
+    with open(APPS_JSON_PATH, 'w', encoding='utf-8') as f:
+        json.dump(apps_data, f, ensure_ascii=False, indent=2)
+    refresh_launch_index()
+
+def _new_app_key(entry: dict) -> str:
+    base = re.sub(r'[^a-z0-9]+', '_', entry['name'].lower()).strip('_')
+    if not base:
+        base = Path(entry.get('exe') or 'app').stem.lower()
+    keys = {a['key'] for a in apps_data}
+    key, n = base, 2
+    while key in keys:
+        key, n = f"{base}_{n}", n + 1
+    return key
+
+def add_discovered_app(entry: dict) -> dict:
+    app_info = {'key': _new_app_key(entry), 'name': entry['name'], 'path': entry['path'],
+                'is_app': 'n' if entry.get('steam_appid') else 'y', 'show_in_menu': True}
+    if entry.get('exe'):
+        app_info['exe'] = entry['exe']
+    if entry.get('steam_appid'):
+        app_info['steam_appid'] = entry['steam_appid']
+    apps_data.append(app_info)
+    save_apps()
+    return app_info
+
+def discovery_view(page: int, header: str = ""):
+    missing = app_discovery.missing()
+    pages = max(1, ceil(len(missing) / DISCOVERY_PAGE))
+    page = min(max(page, 0), pages - 1)
+    kb = InlineKeyboardBuilder()
+    for entry_id, entry in missing[page * DISCOVERY_PAGE:(page + 1) * DISCOVERY_PAGE]:
+        kb.button(text=f"➕ {SOURCE_ICONS.get(entry['source'], '')} {entry['name']}"[:64],
+                  callback_data=f"disc_add:{entry_id}:{page}")
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton(text="◀️", callback_data=f"disc_p:{page - 1}"))
+    if page < pages - 1:
+        nav.append(InlineKeyboardButton(text="▶️", callback_data=f"disc_p:{page + 1}"))
+    kb.adjust(1)
+    if nav:
+        kb.row(*nav)
+    text = (f"{header}Не в меню: {len(missing)} из {len(app_discovery.entries)} найденных программ "
+            f"(стр. {page + 1}/{pages}). Нажмите, чтобы добавить в «Приложения».")
+    return text, kb.as_markup()
+
+@dp.message(Command("discover"))
+async def discover_apps(message: Message):
+    if not has_access(message):
+        return
+    status = await message.answer("🔎 Ищу установленные программы…")
+    started = time.perf_counter()
+    stats = await asyncio.to_thread(app_discovery.rescan)
+    elapsed = (time.perf_counter() - started) * 1000
+    header = f"Проверено источников: {stats['checked']}, перечитано: {stats['read']} за {elapsed:.0f} мс.\n"
+    text, markup = discovery_view(0, header)
+    await status.edit_text(text, reply_markup=markup)
+
+@dp.callback_query(F.data.startswith("disc_p:"))
+async def discover_page(callback: CallbackQuery):
+    if not has_access(callback):
+        return
+    text, markup = discovery_view(int(callback.data.split(":", 1)[1]))
+    await callback.message.edit_text(text, reply_markup=markup)
+    await callback.answer()
+
+@dp.callback_query(F.data.startswith("disc_add:"))
+async def discover_add(callback: CallbackQuery):
+    if not has_access(callback):
+        return
+    _, entry_id, page = callback.data.split(":")
+    entry = app_discovery.entries.get(entry_id)
+    if entry is None or entry_id not in dict(app_discovery.missing()):
+        await callback.answer("Уже добавлено или больше не найдено.", show_alert=True)
+        return
+    app_info = add_discovered_app(entry)
+    text, markup = discovery_view(int(page))
+    await callback.message.edit_text(text, reply_markup=markup)
+    await callback.answer(f"Добавлено: {app_info['name']}")
+
+# ==========================
+# ОТСЛЕЖИВАНИЕ ЗАПУСКА (ПОЯВЛЕНИЕ ОКНА)
+# ==========================
+
+LAUNCH_HISTORY_PATH = APP_DIR / 'launch_history.json'
+LAUNCH_HISTORY_LIMIT = 50
+
+EVENT_SYSTEM_FOREGROUND = 0x0003
+EVENT_OBJECT_SHOW = 0x8002
+OBJID_WINDOW = 0
+CHILDID_SELF = 0
+GA_ROOT = 2
+WINEVENT_OUTOFCONTEXT = 0x0000
+WINEVENT_SKIPOWNPROCESS = 0x0002
+WM_QUIT = 0x0012
+MONITOR_DEFAULTTONULL = 0
+
+class MONITORINFO(ctypes.Structure):
+    _fields_ = [('cbSize', wintypes.DWORD), ('rcMonitor', wintypes.RECT),
+                ('rcWork', wintypes.RECT), ('dwFlags', wintypes.DWORD)]
+
+WinEventProc = ctypes.WINFUNCTYPE(None, wintypes.HANDLE, wintypes.DWORD, wintypes.HWND,
+                                  wintypes.LONG, wintypes.LONG, wintypes.DWORD, wintypes.DWORD)
+
+def _app_exe_name(app_info) -> Optional[str]:
+    """Имя процесса приложения для сопоставления окон: поле exe, хвост пути к .exe
+    или exe, найденный для ярлыка/игры Steam индексом установленных программ."""
+    exe = app_info.get('exe')
+    if exe:
+        return str(exe).lower()
+    path = str(app_info.get('path', ''))
+    if path.lower().endswith('.exe'):
+        return Path(path).name.lower()
+    return app_discovery.exe_for(app_info)
+
+class LaunchTracker:
+    """Ждёт появления главного окна запущенного приложения.
+
+    Вместо периодического обхода процессов подписывается на системное событие
+    EVENT_OBJECT_SHOW (SetWinEventHook) в отдельном потоке с циклом сообщений.
+    Каждое новое окно верхнего уровня передаётся в цикл asyncio и сверяется
+    с ожидающими запусками по pid или имени процесса и передаётся show_listeners.
+    Там же ловится смена активного окна (EVENT_SYSTEM_FOREGROUND) для foreground_listeners.
+    """
+
+    def __init__(self):
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.pending: list[tuple[Optional[str], Optional[int], asyncio.Future]] = []
+        self.foreground_listeners: list = []  # f(hwnd, pid, fullscreen)
+        self.show_listeners: list = []        # f(hwnd, pid) — каждое новое окно верхнего уровня
+        self.history: dict[str, list[dict]] = self._load_history()
+        self._tasks: set[asyncio.Task] = set()
+        self._thread_id = 0
+
+    def _load_history(self) -> dict:
+        try:
+            with open(LAUNCH_HISTORY_PATH, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, json.JSONDecodeError) as e:
+            logging.warning(f"Не удалось прочитать {LAUNCH_HISTORY_PATH.name}: {e}")
+            return {}
+
+    def _save_history(self):
+        try:
+            with open(LAUNCH_HISTORY_PATH, 'w', encoding='utf-8') as f:
+                json.dump(self.history, f, ensure_ascii=False, indent=1)
+        except OSError as e:
+            logging.error(f"Ошибка сохранения {LAUNCH_HISTORY_PATH.name}: {e}")
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        threading.Thread(target=self._hook_thread, name="win-event-hook", daemon=True).start()
+
+    def stop(self):
+        if self._thread_id:
+            ctypes.windll.user32.PostThreadMessageW(self._thread_id, WM_QUIT, 0, 0)
+
+    def _hook_thread(self):
+        user32 = ctypes.WinDLL('user32', use_last_error=True)
+        user32.SetWinEventHook.restype = wintypes.HANDLE
+        user32.SetWinEventHook.argtypes = [wintypes.DWORD, wintypes.DWORD, wintypes.HMODULE, WinEventProc,
+                                           wintypes.DWORD, wintypes.DWORD, wintypes.DWORD]
+        user32.GetAncestor.restype = wintypes.HWND
+        user32.GetAncestor.argtypes = [wintypes.HWND, wintypes.UINT]
+        user32.MonitorFromWindow.restype = wintypes.HANDLE
+        user32.MonitorFromWindow.argtypes = [wintypes.HWND, wintypes.DWORD]
+        user32.GetMonitorInfoW.argtypes = [wintypes.HANDLE, ctypes.POINTER(MONITORINFO)]
+        user32.GetForegroundWindow.restype = wintypes.HWND
+
+        def is_fullscreen(hwnd) -> bool:
+            rect = wintypes.RECT()
+            info = MONITORINFO(cbSize=ctypes.sizeof(MONITORINFO))
+            monitor = user32.MonitorFromWindow(hwnd, MONITOR_DEFAULTTONULL)
+            if not monitor or not user32.GetMonitorInfoW(monitor, ctypes.byref(info)):
+                return False
+            if not user32.GetWindowRect(hwnd, ctypes.byref(rect)):
+                return False
+            m = info.rcMonitor
+            return (rect.left, rect.top, rect.right, rect.bottom) == (m.left, m.top, m.right, m.bottom)
+
+        def on_foreground(hwnd):
+            if not self.foreground_listeners or not hwnd:
+                return
+            pid = wintypes.DWORD()
+            user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
+            self.loop.call_soon_threadsafe(self._on_foreground, hwnd, pid.value, is_fullscreen(hwnd))
+
+        def on_event(_hook, event, hwnd, id_object, id_child, _thread, _time):
+            if event == EVENT_SYSTEM_FOREGROUND:
+                on_foreground(hwnd)
+                return
+            if not (self.pending or self.show_listeners):
+                return
+            if id_object != OBJID_WINDOW or id_child != CHILDID_SELF or not hwnd:
+                return
+            if user32.GetAncestor(hwnd, GA_ROOT) != hwnd or not user32.IsWindowVisible(hwnd):
+                return
+            pid = wintypes.DWORD()
+            user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
+            self.loop.call_soon_threadsafe(self._on_window, hwnd, pid.value)
+
+        proc = WinEventProc(on_event)
+        hook = user32.SetWinEventHook(EVENT_OBJECT_SHOW, EVENT_OBJECT_SHOW, None, proc, 0, 0,
+                                      WINEVENT_OUTOFCONTEXT | WINEVENT_SKIPOWNPROCESS)
+        fg_hook = user32.SetWinEventHook(EVENT_SYSTEM_FOREGROUND, EVENT_SYSTEM_FOREGROUND, None, proc, 0, 0,
+                                         WINEVENT_OUTOFCONTEXT | WINEVENT_SKIPOWNPROCESS)
+        if not hook or not fg_hook:
+            logging.error(f"SetWinEventHook не сработал: {ctypes.get_last_error()}")
+            return
+        self._thread_id = ctypes.windll.kernel32.GetCurrentThreadId()
+        on_foreground(user32.GetForegroundWindow())  # окно, активное на момент старта
+        msg = wintypes.MSG()
+        while user32.GetMessageW(ctypes.byref(msg), None, 0, 0) > 0:
+            user32.TranslateMessage(ctypes.byref(msg))
+            user32.DispatchMessageW(ctypes.byref(msg))
+        user32.UnhookWinEvent(hook)
+        user32.UnhookWinEvent(fg_hook)
+
+    def _on_foreground(self, hwnd: int, pid: int, fullscreen: bool):
+        for listener in self.foreground_listeners:
+            try:
+                listener(hwnd, pid, fullscreen)
+            except Exception as e:
+                logging.error(f"Ошибка обработчика смены окна: {e}")
+
+    def _on_window(self, hwnd: int, pid: int):
+        for listener in self.show_listeners:
+            try:
+                listener(hwnd, pid)
+            except Exception as e:
+                logging.error(f"Ошибка обработчика нового окна: {e}")
+        if not self.pending:
+            return
+        name = None
+        for exe_name, want_pid, fut in list(self.pending):
+            if fut.done():
+                continue
+            if want_pid == pid:
+                fut.set_result(hwnd)
+                continue
+            if exe_name:
+                if name is None:
+                    try:
+                        name = psutil.Process(pid).name().lower()
+                    except psutil.Error:
+                        name = ''
+                if name == exe_name:
+                    fut.set_result(hwnd)
+        self.pending = [p for p in self.pending if not p[2].done()]
+
+    async def wait_window(self, exe_name: Optional[str], pid: Optional[int], timeout: float) -> Optional[int]:
+        """Ждёт окно процесса pid или процесса с именем exe_name. Возвращает hwnd или None по таймауту."""
+        fut = asyncio.get_running_loop().create_future()
+        entry = (exe_name, pid, fut)
+        self.pending.append(entry)
+        try:
+            return await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            if entry in self.pending:
+                self.pending.remove(entry)
+
+    def record(self, key: str, seconds: Optional[float]):
+        runs = self.history.setdefault(key, [])
+        runs.append({'ts': int(time.time()), 'seconds': None if seconds is None else round(seconds, 2)})
+        del runs[:-LAUNCH_HISTORY_LIMIT]
+        self._save_history()
+
+    def track(self, app_info, chat_id: int, started: float, pid: Optional[int]):
+        """Фоновое ожидание окна с отчётом в чат."""
+        exe_name = _app_exe_name(app_info)
+        if self.loop is None or (exe_name is None and pid is None):
+            return
+        task = asyncio.create_task(self._report(app_info, chat_id, started, exe_name, pid))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _report(self, app_info, chat_id: int, started: float, exe_name: Optional[str], pid: Optional[int]):
+        hwnd = await self.wait_window(exe_name, pid, LAUNCH_TRACK_TIMEOUT - (time.monotonic() - started))
+        key = app_info['key']
+        if hwnd is None:
+            self.record(key, None)
+            toggle_state.pop(key, None)
+            text = f"⏱ {app_info['name']}: окно не появилось за {LAUNCH_TRACK_TIMEOUT} с."
+        else:
+            elapsed = time.monotonic() - started
+            self.record(key, elapsed)
+            text = f"✅ {app_info['name']}: окно появилось через {elapsed:.1f} с."
+            # Следим за владельцем окна, а не за pid запуска: лаунчеры и steam:// передают работу другому процессу
+            _, window_pid = win32process.GetWindowThreadProcessId(hwnd)
+            process_watcher.watch(window_pid, app_info['name'], chat_id)
+        try:
+            await bot.send_message(chat_id, text)
+        except Exception as e:
+            logging.error(f"Ошибка отправки отчёта о запуске {key}: {e}")
+
+launch_tracker = LaunchTracker()
+
+@dp.message(Command("launches"))
+async def show_launch_stats(message: Message):
+    if not has_access(message):
+        return
+    if not launch_tracker.history:
+        await message.answer("История запусков пуста.")
+        return
+    names = {a['key']: a.get('name', a['key']) for a in apps_data}
+    lines = ["Время до появления окна (последние запуски):"]
+    for key, runs in launch_tracker.history.items():
+        ok = sorted(r['seconds'] for r in runs if r['seconds'] is not None)
+        fails = len(runs) - len(ok)
+        if ok:
+            median = ok[len(ok) // 2]
+            last = next((r['seconds'] for r in reversed(runs) if r['seconds'] is not None), None)
+            line = f"• {names.get(key, key)}: медиана {median:.1f} с, мин {ok[0]:.1f} с, макс {ok[-1]:.1f} с, последний {last:.1f} с"
+        else:
+            line = f"• {names.get(key, key)}: окно ни разу не дождались"
+        if fails:
+            line += f", таймаутов: {fails}"
+        lines.append(line)
+    await message.answer("\n".join(lines))
+
+# ==========================
+# ЗАВЕРШЕНИЕ ПРОЦЕССОВ (ВЫХОД / ПАДЕНИЕ)
+# ==========================
+
+SYNCHRONIZE = 0x00100000
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+PROCESS_VM_READ = 0x0010
+WT_EXECUTEONLYONCE = 0x00000008
+INFINITE = 0xFFFFFFFF
+WATCH_IGNORED_LIMIT = 4096   # сколько «чужих» pid помнить, чтобы не спрашивать их имя повторно
+
+WaitOrTimerCallback = ctypes.WINFUNCTYPE(None, ctypes.c_void_p, wintypes.BOOLEAN)
+
+class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+    _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+def _exit_text(label: str, code: int, runtime: float, peak: int) -> str:
+    if code >= 0xC0000000:
+        head = f"💥 {label}: аварийное завершение (0x{code:08X})"
+    elif code == 0:
+        head = f"⏹ {label}: завершился"
+    else:
+        head = f"⚠️ {label}: завершился с кодом {code}"
+    text = f"{head}, работал {_human_duration(int(runtime))}"
+    if peak:
+        text += f", пик памяти {_human_size(peak)}"
+    return text
+
+class ProcessWatcher:
+    """Сообщает о завершении процессов: запущенных ботом и приложений с "watch": true.
+
+    Каждый процесс ждётся через RegisterWaitForSingleObject — ожидание ведёт системный
+    пул потоков (до 63 процессов на поток), бот ничего не опрашивает. Когда процесс
+    завершился, колбэк передаёт его pid в цикл asyncio; код выхода и пиковый рабочий
+    набор читаются из ещё открытого дескриптора. Новые процессы из списка наблюдения
+    замечаются по появлению их окна (событие от LaunchTracker).
+    """
+
+    def __init__(self):
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.kernel32 = None
+        self.watches: dict[int, dict] = {}   # pid → {'label', 'chat_id', 'handle', 'wait', 'started'}
+        self.ignored: set[int] = set()
+        self._callback = WaitOrTimerCallback(self._on_signal)
+        self._tasks: set[asyncio.Task] = set()
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        k32 = ctypes.WinDLL('kernel32', use_last_error=True)
+        k32.OpenProcess.restype = wintypes.HANDLE
+        k32.OpenProcess.argtypes = [wintypes.DWORD, wintypes.BOOL, wintypes.DWORD]
+        k32.RegisterWaitForSingleObject.argtypes = [ctypes.POINTER(wintypes.HANDLE), wintypes.HANDLE,
+                                                    WaitOrTimerCallback, ctypes.c_void_p, wintypes.ULONG,
+                                                    wintypes.ULONG]
+        k32.UnregisterWait.argtypes = [wintypes.HANDLE]
+        k32.GetExitCodeProcess.argtypes = [wintypes.HANDLE, ctypes.POINTER(wintypes.DWORD)]
+        k32.K32GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.POINTER(PROCESS_MEMORY_COUNTERS),
+                                                wintypes.DWORD]
+        k32.CloseHandle.argtypes = [wintypes.HANDLE]
+        self.kernel32 = k32
+        self._spawn(self._watch_running())
+
+    def stop(self):
+        for pid in list(self.watches):
+            self._release(self.watches.pop(pid))
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def watched_apps(self) -> dict[str, dict]:
+        return {_app_exe_name(a): a for a in apps_data if a.get('watch') and _app_exe_name(a)}
+
+    async def _watch_running(self):
+        # Уже запущенные процессы из списка — один проход при старте, дальше только события окон
+        names = self.watched_apps()
+        if not names:
+            return
+        found = await asyncio.to_thread(
+            lambda: [(p.info['pid'], p.info['name'].lower()) for p in psutil.process_iter(['pid', 'name'])
+                     if p.info['name'] and p.info['name'].lower() in names])
+        for pid, name in found:
+            self.watch(pid, names[name]['name'], USER_ID)
+
+    def on_window(self, hwnd: int, pid: int):
+        if pid in self.watches or pid in self.ignored:
+            return
+        names = self.watched_apps()
+        if not names:
+            return
+        try:
+            name = psutil.Process(pid).name().lower()
+        except psutil.Error:
+            return
+        app_info = names.get(name)
+        if app_info:
+            self.watch(pid, app_info['name'], USER_ID)
+            return
+        if len(self.ignored) >= WATCH_IGNORED_LIMIT:
+            self.ignored.clear()
+        self.ignored.add(pid)
+
+    def watch(self, pid: int, label: str, chat_id: int):
+        if self.kernel32 is None or pid in self.watches:
+            return
+        k32 = self.kernel32
+        handle = (k32.OpenProcess(SYNCHRONIZE | PROCESS_QUERY_LIMITED_INFORMATION | PROCESS_VM_READ, False, pid)
+                  or k32.OpenProcess(SYNCHRONIZE | PROCESS_QUERY_LIMITED_INFORMATION, False, pid))
+        if not handle:
+            logging.warning(f"Не удалось открыть процесс {pid} ({label}): {ctypes.get_last_error()}")
+            return
+        try:
+            started = psutil.Process(pid).create_time()
+        except psutil.Error:
+            started = time.time()
+        wait = wintypes.HANDLE()
+        if not k32.RegisterWaitForSingleObject(ctypes.byref(wait), handle, self._callback, pid,
+                                               INFINITE, WT_EXECUTEONLYONCE):
+            k32.CloseHandle(handle)
+            logging.warning(f"Не удалось ждать процесс {pid} ({label}): {ctypes.get_last_error()}")
+            return
+        self.ignored.discard(pid)
+        self.watches[pid] = {'label': label, 'chat_id': chat_id, 'handle': handle, 'wait': wait, 'started': started}
+
+    def _on_signal(self, context, _timed_out):
+        # Поток системного пула: только передаём pid в цикл asyncio
+        self.loop.call_soon_threadsafe(self._on_exit, context)
+
+    def _on_exit(self, pid: int):
+        w = self.watches.pop(pid, None)
+        if w is None:
+            return
+        code = wintypes.DWORD()
+        self.kernel32.GetExitCodeProcess(w['handle'], ctypes.byref(code))
+        counters = PROCESS_MEMORY_COUNTERS(cb=ctypes.sizeof(PROCESS_MEMORY_COUNTERS))
+        peak = 0
+        if self.kernel32.K32GetProcessMemoryInfo(w['handle'], ctypes.byref(counters), counters.cb):
+            peak = counters.PeakWorkingSetSize
+        self._release(w)
+        runtime = time.time() - w['started']
+        journal_action(f"exit:{w['label']}", runtime, 'ok' if code.value == 0 else 'failed',
+                       pid=pid, exit_code=code.value, peak_bytes=peak)
+        self._spawn(self._notify(w['chat_id'], _exit_text(w['label'], code.value, runtime, peak)))
+
+    def _release(self, w: dict):
+        self.kernel32.UnregisterWait(w['wait'])
+        self.kernel32.CloseHandle(w['handle'])
+
+    async def _notify(self, chat_id: int, text: str):
+        try:
+            await bot.send_message(chat_id, text)
+        except Exception as e:
+            logging.error(f"Ошибка отправки уведомления о завершении: {e}")
+
+process_watcher = ProcessWatcher()
+launch_tracker.show_listeners.append(process_watcher.on_window)
+
+@dp.message(Command("watches"))
+async def show_watches(message: Message):
+    if not has_access(message):
+        return
+    if not process_watcher.watches:
+        await message.answer("Сейчас ни за одним процессом не слежу.")
+        return
+    now = time.time()
+    lines = [f"Слежу за процессами ({len(process_watcher.watches)}):"]
+    for pid, w in sorted(process_watcher.watches.items(), key=lambda item: item[1]['started']):
+        lines.append(f"• {w['label']} (pid {pid}) — работает {_human_duration(int(now - w['started']))}")
+    await message.answer("\n".join(lines[:101]))
+
+# ==========================
+# РЕЖИМ МИНИМАЛЬНОЙ НАГРУЗКИ (ИГРА)
+# ==========================
+
+LOW_IMPACT_STRETCH = 5       # во сколько раз реже фоновые обновления во время игры
+LOW_IMPACT_RECHECK = 30.0    # как часто во время игры проверять, жив ли её процесс (сек)
+LOW_IMPACT_SHELL = {'explorer.exe', 'searchhost.exe', 'shellexperiencehost.exe', 'startmenuexperiencehost.exe'}
+LOW_IMPACT_MODES = {'auto': "авто", 'on': "всегда", 'off': "выключен"}
+
+BELOW_NORMAL_PRIORITY = getattr(psutil, 'BELOW_NORMAL_PRIORITY_CLASS', 10)
+
+class LowImpactMode:
+    """Пока идёт игра, бот уступает ей ресурсы.
+
+    Игра определяется по смене активного окна (без опроса процессов): процесс из
+    GAME_PROCESSES или с "game": true в apps.json держит режим, пока жив; любое
+    другое полноэкранное окно — пока оно активно. В режиме процесс бота получает
+    приоритет ниже обычного и закрепляется на последних LOW_IMPACT_CORES ядрах,
+    фоновые обновления идут в LOW_IMPACT_STRETCH раз реже, скриншоты уменьшаются,
+    а тяжёлые загрузки ждут конца игры. Нагрузка бота считается отдельно по режимам.
+    """
+
+    def __init__(self, setting: str):
+        self.setting = setting if setting in LOW_IMPACT_MODES else 'auto'
+        self.active = False
+        self.game: Optional[str] = None
+        self.game_pid: Optional[int] = None
+        self.game_listed = False
+        self.reason = ""
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self._saved: Optional[tuple[int, list[int]]] = None
+        self._recheck: Optional[asyncio.Task] = None
+        self.proc = psutil.Process()
+        self.stats = {False: [0.0, 0.0, 0], True: [0.0, 0.0, 0]}  # режим → [стена, CPU, переключения]
+        self._mark = self._sample()
+
+    def _sample(self) -> tuple[float, float, int]:
+        cpu = self.proc.cpu_times()
+        return time.monotonic(), cpu.user + cpu.system, self.proc.num_ctx_switches().voluntary
+
+    def _account(self):
+        now = self._sample()
+        bucket = self.stats[self.active]
+        for i in range(3):
+            bucket[i] += now[i] - self._mark[i]
+        self._mark = now
+
+    def game_names(self) -> set[str]:
+        names = {n.strip().lower() for n in GAME_PROCESSES.split(',') if n.strip()}
+        names.update(_app_exe_name(a) for a in apps_data if a.get('game') and _app_exe_name(a))
+        return names
+
+    def interval(self, seconds: float) -> float:
+        """Период фонового обновления с учётом режима."""
+        return seconds * LOW_IMPACT_STRETCH if self.active else seconds
+
+    def on_foreground(self, hwnd: int, pid: int, fullscreen: bool):
+        if self.setting == 'off' and not self.active:
+            return
+        try:
+            name = psutil.Process(pid).name().lower()
+        except psutil.Error:
+            return
+        if name in self.game_names():
+            self.game, self.game_pid, self.game_listed = name, pid, True
+        elif fullscreen and name not in LOW_IMPACT_SHELL:
+            self.game, self.game_pid, self.game_listed = f"{name} (полный экран)", pid, False
+        elif not self.game_listed or not self._game_alive():
+            self.game, self.game_pid, self.game_listed = None, None, False
+        self.apply()
+
+    def _game_alive(self) -> bool:
+        try:
+            return self.game_pid is not None and psutil.Process(self.game_pid).is_running()
+        except psutil.Error:
+            return False
+
+    def apply(self):
+        want = self.setting == 'on' or (self.setting == 'auto' and self.game is not None)
+        if want == self.active:
+            return
+        self._account()
+        self._set_footprint(want)
+        self.active = want
+        if want:
+            self.reason = self.game or "вручную"
+            self.idle.clear()
+            if self._recheck is None or self._recheck.done():
+                self._recheck = asyncio.create_task(self._recheck_loop())
+        else:
+            self.idle.set()
+            if self._recheck:
+                self._recheck.cancel()
+        logging.info(f"Режим минимальной нагрузки {'включён' if want else 'выключен'} ({self.reason}).")
+        journal_action('low_impact', 0.0, 'on' if want else 'off', reason=self.reason)
+
+    async def _recheck_loop(self):
+        # Игра могла закрыться в фоне, пока активно другое окно, — событий тогда не будет
+        while True:
+            await asyncio.sleep(LOW_IMPACT_RECHECK)
+            if self.game_listed and not self._game_alive():
+                self.game, self.game_pid, self.game_listed = None, None, False
+                self.apply()
+
+    def _set_footprint(self, low: bool):
+        try:
+            if low:
+                self._saved = (self.proc.nice(), self.proc.cpu_affinity())
+                self.proc.nice(BELOW_NORMAL_PRIORITY)
+                cores = self._saved[1]
+                if len(cores) > LOW_IMPACT_CORES:
+                    self.proc.cpu_affinity(cores[-LOW_IMPACT_CORES:])
+            elif self._saved:
+                self.proc.nice(self._saved[0])
+                self.proc.cpu_affinity(self._saved[1])
+        except (psutil.Error, AttributeError) as e:
+            logging.warning(f"Не удалось изменить приоритет/ядра бота: {e}")
+
+    def release_child(self, pid: Optional[int]):
+        """Возвращает запущенному процессу обычный приоритет и все ядра (они наследуются от бота)."""
+        if not self.active or not self._saved or pid is None:
+            return
+        try:
+            child = psutil.Process(pid)
+            child.nice(self._saved[0])
+            child.cpu_affinity(self._saved[1])
+        except (psutil.Error, AttributeError):
+            pass
+
+    async def wait_heavy(self, chat_id: int, what: str):
+        """Тяжёлые загрузки откладываются до конца игры."""
+        if not self.active:
+            return
+        await bot.send_message(chat_id, f"🎮 Идёт игра — отправлю {what} после её закрытия "
+                                        f"(или выключите режим: /lowimpact off).")
+        await self.idle.wait()
+
+    def stop(self):
+        if self._recheck:
+            self._recheck.cancel()
+        if self.active:
+            self._set_footprint(False)
+
+    def report(self) -> str:
+        self._account()
+        state = f"включён ({self.reason})" if self.active else "выключен"
+        lines = [f"🎮 Режим минимальной нагрузки: {state}, настройка: {LOW_IMPACT_MODES[self.setting]}"]
+        try:
+            lines.append(f"Приоритет: {self.proc.nice()}, ядра: {', '.join(map(str, self.proc.cpu_affinity()))}")
+        except (psutil.Error, AttributeError):
+            pass
+        lines.append("Нагрузка бота:")
+        for active, title in ((False, "обычный режим"), (True, "режим игры")):
+            wall, cpu, switches = self.stats[active]
+            if wall < 1:
+                lines.append(f"• {title}: ещё не было")
+                continue
+            lines.append(f"• {title}: {cpu * 100 / wall:.2f}% ядра, {switches / wall:.0f} переключений/с "
+                         f"за {_human_duration(int(wall))}")
+        lines.append(f"RSS: {self.proc.memory_info().rss / 1024 / 1024:.0f} МБ")
+        return "\n".join(lines)
+
+low_impact = LowImpactMode(LOW_IMPACT)
+launch_tracker.foreground_listeners.append(low_impact.on_foreground)
+
+@dp.message(Command("lowimpact"))
+async def low_impact_command(message: Message):
+    if not has_access(message):
+        return
+    args = message.text.split()[1:]
+    if args:
+        if args[0] not in LOW_IMPACT_MODES:
+            await message.answer("Использование: /lowimpact [auto|on|off]")
+            return
+        low_impact.setting = args[0]
+        save_config_setting('Settings', 'LOW_IMPACT', args[0])
+        low_impact.apply()
+    await message.answer(low_impact.report())
+
+# ==========================
+# СЦЕНЫ (ПАРАЛЛЕЛЬНЫЙ ЗАПУСК НЕСКОЛЬКИХ ПРИЛОЖЕНИЙ)
+# ==========================
+
+def _scene_steps(scene_info) -> list[tuple[str, list[str]]]:
+    """Шаги сцены как [(key, [зависимости])]. Шаг — строка-ключ или {"app": key, "after": key|[keys]}."""
+    steps = []
+    for step in scene_info.get('steps', []):
+        if isinstance(step, str):
+            steps.append((step, []))
+        else:
+            steps.append((step['app'], _as_list(step.get('after'))))
+    return steps
+
+def _check_scene(steps: list[tuple[str, list[str]]]) -> Optional[str]:
+    keys = [key for key, _ in steps]
+    known = {a['key'] for a in apps_data}
+    if len(set(keys)) != len(keys):
+        return "одно приложение указано в сцене дважды"
+    for key, deps in steps:
+        if key not in known:
+            return f"приложение «{key}» не найдено в apps.json"
+        for dep in deps:
+            if dep not in keys:
+                return f"«{key}» ждёт «{dep}», которого нет в сцене"
+    # Поиск цикла зависимостей (обход в глубину)
+    graph = dict(steps)
+    state = {}
+    def visit(key) -> bool:
+        if state.get(key) == 1:
+            return True
+        if state.get(key) == 2:
+            return False
+        state[key] = 1
+        if any(visit(dep) for dep in graph[key]):
+            return True
+        state[key] = 2
+        return False
+    if any(visit(key) for key in graph):
+        return "циклическая зависимость шагов"
+    return None
+
+async def run_scene(scene_info, chat_id: int):
+    """Запускает шаги сцены: независимые — параллельно, зависимые — после появления окна предпосылки."""
+    launch_index.touch('app', scene_info['key'])
+    steps = _scene_steps(scene_info)
+    error = _check_scene(steps)
+    if error:
+        await bot.send_message(chat_id, f"Сцена «{scene_info['name']}» не запущена: {error}.")
+        return
+    status = await bot.send_message(chat_id, f"🎬 Сцена «{scene_info['name']}»: запускаю {len(steps)} шаг(ов)…")
+    apps_by_key = {a['key']: a for a in apps_data}
+    ready = {key: asyncio.get_running_loop().create_future() for key, _ in steps}
+    report: dict[str, str] = {}
+    scene_started = time.monotonic()
+
+    async def run_step(key: str, deps: list[str]):
+        app_info = apps_by_key[key]
+        name = app_info.get('name', key)
+        try:
+            for dep in deps:
+                if not await ready[dep]:
+                    report[key] = f"⏭ {name} — пропущен: «{apps_by_key[dep].get('name', dep)}» не поднялся"
+                    return
+            started = time.monotonic()
+            launch_index.touch('app', key)
+            launched, pid, notice = await asyncio.to_thread(_start_app, app_info)
+            if not launched:
+                report[key] = f"✅ {name} — {notice or 'уже запущено'}"
+                ready[key].set_result(not notice)
+                return
+            exe_name = _app_exe_name(app_info)
+            if exe_name is None and pid is None:
+                report[key] = f"✅ {name} — запущено за {time.monotonic() - started:.1f} с (окно не отслеживается)"
+                ready[key].set_result(True)
+                return
+            hwnd = await launch_tracker.wait_window(exe_name, pid, LAUNCH_TRACK_TIMEOUT)
+            elapsed = time.monotonic() - started
+            launch_tracker.record(key, elapsed if hwnd else None)
+            if hwnd:
+                report[key] = f"✅ {name} — окно через {elapsed:.1f} с"
+                _, window_pid = win32process.GetWindowThreadProcessId(hwnd)
+                process_watcher.watch(window_pid, name, chat_id)
+            else:
+                report[key] = f"⏱ {name} — окно не появилось за {LAUNCH_TRACK_TIMEOUT} с"
+            ready[key].set_result(bool(hwnd))
+        except Exception as e:
+            report[key] = f"❌ {name} — {e}"
+        finally:
+            if not ready[key].done():
+                ready[key].set_result(False)
+
+    await asyncio.gather(*(run_step(key, deps) for key, deps in steps))
+    total = time.monotonic() - scene_started
+    failed = sum(1 for line in report.values() if not line.startswith("✅"))
+    head = f"🎬 Сцена «{scene_info['name']}» за {total:.1f} с" + (f", проблем: {failed}" if failed else "")
+    text = "\n".join([head] + [report[key] for key, _ in steps])
+    try:
+        await status.edit_text(text)
+    except aiogram.exceptions.TelegramBadRequest:
+        await bot.send_message(chat_id, text)
+
 # ==========================
 # МЕНЮ «КОМБИНАЦИИ»
 # ==========================
@@ -711,6 +2361,18 @@ def _find_latest_clip(since_ts: float) -> Optional[Path]:
             continue
     return newest[1] if newest else None
 
+def _capture_screenshot(reduced: bool) -> Path:
+    """Снимок экрана в файл. Во время игры — вполовину меньше и в JPEG: кодируется в разы быстрее PNG."""
+    screenshot = pyautogui.screenshot()
+    if reduced:
+        screenshot = screenshot.resize((screenshot.width // 2, screenshot.height // 2))
+        path = APP_DIR / "screenshot.jpg"
+        screenshot.save(path, quality=80)
+    else:
+        path = APP_DIR / "screenshot.png"
+        screenshot.save(path)
+    return path
+
 # ===== Основная логика выполнения комбинаций =====
 
 @dp.callback_query(F.data.startswith("combo_run_"))
@@ -721,15 +2383,19 @@ async def run_combo(callback: CallbackQuery):
         await callback.answer("Комбинация не найдена!", show_alert=True)
         return
     await callback.answer()
+    await execute_combo(combo_info, callback.from_user.id)
+
+async def execute_combo(combo_info, chat_id: int):
+    """Выполняет комбинацию из combos.json, ответы отправляет в chat_id."""
+    key = combo_info['key']
+    launch_index.touch('combo', key)
     try:
         # Спец-ветки
         if key == "screenshot":
-            screenshot = pyautogui.screenshot()
-            screenshot_path = APP_DIR / "screenshot.png"
-            screenshot.save(screenshot_path)
-            await bot.send_photo(chat_id=callback.from_user.id, photo=FSInputFile(screenshot_path))
+            screenshot_path = await asyncio.to_thread(_capture_screenshot, low_impact.active)
+            await bot.send_photo(chat_id=chat_id, photo=input_file(screenshot_path))
             os.remove(screenshot_path)
-            await callback.message.answer("Скриншот отправлен.")
+            await bot.send_message(chat_id, "Скриншот отправлен.")
             return
 
         if key == "screen_rec":
@@ -738,22 +2404,22 @@ async def run_combo(callback: CallbackQuery):
                 pyautogui.hotkey('winleft', 'alt', 'r')
                 record_state['active'] = True
                 record_state['started_at'] = time.time()
-                await callback.message.answer("🎥 Запись начата (Win+Alt+R). Повторное нажатие остановит запись.")
+                await bot.send_message(chat_id, "🎥 Запись начата (Win+Alt+R). Повторное нажатие остановит запись.")
             else:
                 pyautogui.hotkey('winleft', 'alt', 'r')
                 record_state['active'] = False
                 # Дадим системе дописать файл
                 await asyncio.sleep(2.0)
-                clip = _find_latest_clip(record_state['started_at'])
-                user_id = callback.from_user.id
-                last_clip_by_user[user_id] = clip
+                clip = await asyncio.to_thread(_find_latest_clip, record_state['started_at'])
+                last_clip_by_user[chat_id] = clip
                 if clip and clip.exists():
                     kb = InlineKeyboardBuilder()
                     kb.button(text="📤 Отправить в Telegram", callback_data="send_last_clip_yes")
                     kb.button(text="Оставить в папке", callback_data="send_last_clip_no")
                     kb.adjust(1, 1)
                     human_path = str(clip)
-                    await callback.message.answer(
+                    await bot.send_message(
+                        chat_id,
                         f"🟢 Запись остановлена.\nНашёл последний клип:\n<code>{human_path}</code>\nОтправить в Telegram?",
                         reply_markup=kb.as_markup(),
                         parse_mode="HTML"
@@ -762,7 +2428,8 @@ async def run_combo(callback: CallbackQuery):
                     # Не нашли клип — просто сообщим, где искать
                     dirs = _captures_dirs()
                     hint = "\n".join(str(d) for d in dirs) if dirs else "(Не удалось определить папку клипов)"
-                    await callback.message.answer(
+                    await bot.send_message(
+                        chat_id,
                         "🟡 Запись остановлена, но не удалось найти созданный файл автоматически.\n"
                         f"Проверьте папку клипов:\n{hint}"
                     )
@@ -770,15 +2437,13 @@ async def run_combo(callback: CallbackQuery):
 
         if combo_info.get('type') == 'batch' and 'path' in combo_info:
             full_path = APP_DIR / combo_info['path']
-            ext = full_path.suffix.lower()
-            if ext in ['.bat', '.cmd']:
-                subprocess.Popen(["cmd.exe", "/c", "start", "", str(full_path)], shell=True)
-            elif ext == '.ps1':
-                subprocess.Popen(["powershell.exe", "-NoProfile", "-ExecutionPolicy", "Bypass", "-File", str(full_path)], shell=True)
-            elif ext == '.py':
-                subprocess.Popen(["cmd.exe", "/c", "start", "", "python", str(full_path)], shell=True)
+            if not full_path.is_file():
+                await bot.send_message(chat_id, f"Скрипт не найден: {full_path}")
+                return
+            if combo_info.get('detach'):
+                _run_script_detached(full_path)
             else:
-                subprocess.Popen(["cmd.exe", "/c", "start", "", str(full_path)], shell=True)
+                await script_runner.run(combo_info, full_path, chat_id)
             return
 
         elif combo_info.get('type') == 'set_search_browser':
@@ -788,9 +2453,9 @@ async def run_combo(callback: CallbackQuery):
                 user_data['preferred_search_browser_key'] = target_key
                 save_config_setting('Settings', 'PREFERRED_SEARCH_BROWSER_KEY', target_key)
                 browser_name = next((app['name'] for app in apps_data if app['key'] == target_key), target_key)
-                await callback.message.answer(f"Выбран браузер для поиска: {browser_name}. Настройка сохранена.")
+                await bot.send_message(chat_id, f"Выбран браузер для поиска: {browser_name}. Настройка сохранена.")
             else:
-                await callback.message.answer("Браузер не найден в списке приложений!")
+                await bot.send_message(chat_id, "Браузер не найден в списке приложений!")
             return
 
         keys = combo_info.get('keys', [])
@@ -802,7 +2467,7 @@ async def run_combo(callback: CallbackQuery):
             pyautogui.keyDown('f'); pyautogui.keyUp('f'); return
 
         if not keys:
-            await callback.message.answer("Комбинация без клавиш не выполняет действий.")
+            await bot.send_message(chat_id, "Комбинация без клавиш не выполняет действий.")
             return
 
         layout = combo_info.get('layout', 'none')
@@ -821,11 +2486,11 @@ async def run_combo(callback: CallbackQuery):
         if switched:
             switch_layout(current_layout)
     except Exception as e:
-        await callback.message.answer(f"Ошибка выполнения: {e}")
+        await bot.send_message(chat_id, f"Ошибка выполнения: {e}")
 
 # ===== Кнопки «Отправить клип в Telegram / Оставить в папке» =====
 
-@dp.callback_query(F.data == "send_last_clip_yes")
+@dp.callback_query(F.data == "send_last_clip_yes", flags={'progress': "Отправляю клип…"})
 async def send_last_clip_yes(callback: CallbackQuery):
     user_id = callback.from_user.id
     clip = last_clip_by_user.get(user_id)
@@ -834,14 +2499,16 @@ async def send_last_clip_yes(callback: CallbackQuery):
         return
     try:
         size_mb = clip.stat().st_size / (1024 * 1024)
-        if size_mb > 2000:  # простая защита от слишком больших файлов
+        if size_mb > MAX_UPLOAD_MB:  # лимит Bot API на отправку файлов
             await callback.message.answer(
                 f"Файл слишком большой для отправки через бота ({size_mb:.0f} МБ). Оставляю в папке:\n<code>{clip}</code>",
                 parse_mode="HTML"
             )
             await callback.answer()
             return
-        await bot.send_video(chat_id=user_id, video=FSInputFile(clip), caption=f"🎥 Клип: {clip.name}")
+        if not media_cache.known('video', clip):
+            await low_impact.wait_heavy(user_id, f"клип {clip.name}")
+        await send_cached('video', user_id, clip, caption=f"🎥 Клип: {clip.name}")
         await callback.message.answer("Готово! Клип отправлен в Telegram.")
         await callback.answer()
     except Exception as e:
@@ -858,6 +2525,738 @@ async def send_last_clip_no(callback: CallbackQuery):
         await callback.message.answer("Оставил как есть. (Файл не определён)")
     await callback.answer()
 
+# ==========================
+# СКРИПТЫ (type: "batch") С ЖИВЫМ ВЫВОДОМ
+# ==========================
+
+SCRIPT_LOG_DIR = APP_DIR / 'logs' / 'scripts'
+SCRIPT_EDIT_INTERVAL = 2.0   # не чаще одной правки сообщения за столько секунд
+SCRIPT_TAIL_CHARS = 3500     # хвост вывода в сообщении (лимит Telegram — 4096 символов)
+SCRIPT_KEEP_RUNS = 20        # сколько последних запусков (и их логов) хранить
+SCRIPT_NOTIFY_AFTER = 30.0   # скрипт дольше стольких секунд — по завершении отдельное уведомление
+SCRIPT_DRAIN_SECONDS = 1.0   # сколько дочитывать вывод после выхода самого скрипта
+
+def _python_interpreter() -> str:
+    # В собранном EXE sys.executable — сам бот, скрипт нужно отдать системному Python
+    if not getattr(sys, 'frozen', False):
+        return sys.executable
+    return shutil.which('python') or shutil.which('py') or 'python'
+
+def _script_command(path: Path) -> tuple[list[str], str]:
+    """Команда запуска и кодировка её вывода (консоль Windows пишет в OEM-кодировке)."""
+    console = 'oem' if sys.platform == 'win32' else 'utf-8'
+    ext = path.suffix.lower()
+    if ext == '.ps1':
+        return ["powershell.exe", "-NoProfile", "-ExecutionPolicy", "Bypass", "-File", str(path)], console
+    if ext == '.py':
+        return [_python_interpreter(), "-u", str(path)], 'utf-8'
+    return ["cmd.exe", "/c", str(path)], console
+
+def _run_script_detached(path: Path):
+    """Запуск без вывода и контроля ("detach": true): скрипт живёт сам по себе, как при двойном клике."""
+    ext = path.suffix.lower()
+    if ext == '.ps1':
+        proc = subprocess.Popen(["powershell.exe", "-NoProfile", "-ExecutionPolicy", "Bypass", "-File", str(path)], shell=True)
+    elif ext == '.py':
+        proc = subprocess.Popen(["cmd.exe", "/c", "start", "", _python_interpreter(), str(path)], shell=True)
+    else:
+        proc = subprocess.Popen(["cmd.exe", "/c", "start", "", str(path)], shell=True)
+    low_impact.release_child(proc.pid)
+
+class ScriptRun:
+    def __init__(self, run_id: int, combo_info: dict, path: Path, chat_id: int):
+        self.id = run_id
+        self.name = combo_info.get('name', combo_info['key'])
+        self.timeout = combo_info.get('timeout', SCRIPT_TIMEOUT)
+        self.path = path
+        self.chat_id = chat_id
+        self.log_path = SCRIPT_LOG_DIR / f"{combo_info['key']}-{run_id}.log"
+        self.tail = ""
+        self.size = 0
+        self.dirty = False
+        self.status = "⏳ в очереди"
+        self.proc: Optional[asyncio.SubprocessTransport] = None
+        self.cancelled = False
+        self.finished = False
+        self.message: Optional[Message] = None
+
+    def feed(self, text: str):
+        self.size += len(text)
+        self.tail = (self.tail + text)[-SCRIPT_TAIL_CHARS:]
+        self.dirty = True
+
+    def render(self) -> str:
+        tail = self.tail.replace('\r\n', '\n')
+        # Прогресс-бары перерисовывают строку через \r — показываем последнюю версию строки
+        tail = "\n".join(line.rsplit('\r', 1)[-1] for line in tail.split('\n')).strip()
+        if self.size > len(self.tail):
+            tail = "…\n" + tail.split('\n', 1)[-1]
+        head = f"📜 {self.name}: {self.status}"
+        if not tail:
+            return head
+        return f"{head}\n<pre>{escape(tail)}</pre>"
+
+    def keyboard(self):
+        kb = InlineKeyboardBuilder()
+        if not self.finished:
+            kb.button(text="⛔ Остановить", callback_data=f"script_stop:{self.id}")
+        elif self.size:
+            kb.button(text="📄 Полный вывод", callback_data=f"script_log:{self.id}")
+        return kb.as_markup()
+
+class _ScriptOutput(asyncio.SubprocessProtocol):
+    """Пишет вывод скрипта в лог и в ScriptRun. exited — завершился сам скрипт,
+    closed — закрылся канал вывода (его могут держать запущенные скриптом программы)."""
+
+    def __init__(self, run: ScriptRun, encoding: str, log):
+        loop = asyncio.get_running_loop()
+        self.run = run
+        self.log = log
+        self.decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        self.exited = loop.create_future()
+        self.closed = loop.create_future()
+
+    def _write(self, text: str):
+        if text and not self.log.closed:
+            self.log.write(text)
+            self.run.feed(text)
+
+    def pipe_data_received(self, fd, data):
+        self._write(self.decoder.decode(data))
+
+    def pipe_connection_lost(self, fd, exc):
+        if not self.closed.done():
+            self.closed.set_result(None)
+
+    def process_exited(self):
+        self.exited.set_result(None)
+
+    def flush(self):
+        self._write(self.decoder.decode(b'', final=True))
+
+class ScriptRunner:
+    """Запускает скрипты как asyncio-подпроцессы, выводит stdout/stderr в одно
+    редактируемое сообщение. Одновременно работает не больше SCRIPT_MAX_PARALLEL."""
+
+    def __init__(self, max_parallel: int):
+        self.slots = asyncio.Semaphore(max(1, max_parallel))
+        self.runs: OrderedDict[int, ScriptRun] = OrderedDict()
+        self._next_id = 1
+
+    async def run(self, combo_info: dict, path: Path, chat_id: int):
+        run = ScriptRun(self._next_id, combo_info, path, chat_id)
+        self._next_id += 1
+        self.runs[run.id] = run
+        self._evict()
+        run.message = await bot.send_message(chat_id, run.render(), parse_mode="HTML", reply_markup=run.keyboard())
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            async with self.slots:
+                if run.cancelled:
+                    run.status = "⛔ отменён до запуска"
+                    outcome = 'cancelled'
+                    return
+                outcome = await self._execute(run)
+        except Exception as e:
+            run.status = f"❌ ошибка запуска: {e}"
+            logging.error(f"Ошибка скрипта {path}: {e}")
+        finally:
+            run.finished = True
+            elapsed = time.perf_counter() - started
+            journal_action(f"script:{combo_info['key']}", elapsed, outcome, run_id=run.id)
+            await self.publish(run)
+            if outcome != 'cancelled' and elapsed >= SCRIPT_NOTIFY_AFTER:
+                # Правка сообщения не даёт уведомления — о долгом скрипте сообщаем ответом
+                await run.message.reply(f"📜 {run.name}: {run.status}")
+
+    def _evict(self):
+        # Убираем только завершённые запуски: лог работающего ещё открыт на запись
+        finished = [run_id for run_id, r in self.runs.items() if r.finished]
+        while len(self.runs) > SCRIPT_KEEP_RUNS and finished:
+            old = self.runs.pop(finished.pop(0))
+            try:
+                old.log_path.unlink(missing_ok=True)
+            except OSError:
+                pass
+
+    async def _execute(self, run: ScriptRun) -> str:
+        SCRIPT_LOG_DIR.mkdir(parents=True, exist_ok=True)
+        command, encoding = _script_command(run.path)
+        run.status = "▶️ выполняется"
+        run.dirty = True
+        loop = asyncio.get_running_loop()
+        with open(run.log_path, 'w', encoding='utf-8') as log:
+            run.proc, output = await loop.subprocess_exec(
+                lambda: _ScriptOutput(run, encoding, log),
+                *command,
+                cwd=str(run.path.parent),
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                env={**os.environ, 'PYTHONIOENCODING': 'utf-8'},
+                creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0),
+            )
+            low_impact.release_child(run.proc.get_pid())
+            started = time.perf_counter()
+            editor = asyncio.create_task(self._edit_loop(run))
+            try:
+                # proc.wait() ждал бы закрытия канала вывода, а его держит и программа,
+                # запущенная скриптом через start. Ждём выхода самого скрипта.
+                await asyncio.wait_for(asyncio.shield(output.exited), run.timeout)
+            except asyncio.TimeoutError:
+                self._kill(run)
+                await output.exited
+                run.status = f"⏱ остановлен по таймауту ({_human_duration(run.timeout)})"
+                return 'timeout'
+            finally:
+                # Дочитываем то, что скрипт успел вывести, и отпускаем канал
+                await asyncio.wait({output.closed}, timeout=SCRIPT_DRAIN_SECONDS)
+                output.flush()
+                run.proc.close()
+                editor.cancel()
+        code = run.proc.get_returncode()
+        elapsed = time.perf_counter() - started
+        if run.cancelled:
+            run.status = f"⛔ остановлен ({elapsed:.1f} с)"
+            return 'cancelled'
+        mark = "✅" if code == 0 else "⚠️"
+        run.status = f"{mark} код {code}, {elapsed:.1f} с"
+        return 'ok' if code == 0 else 'failed'
+
+    async def _edit_loop(self, run: ScriptRun):
+        while True:
+            await asyncio.sleep(low_impact.interval(SCRIPT_EDIT_INTERVAL))
+            if run.dirty:
+                await self.publish(run)
+
+    async def publish(self, run: ScriptRun):
+        run.dirty = False
+        try:
+            await run.message.edit_text(run.render(), parse_mode="HTML", reply_markup=run.keyboard())
+        except aiogram.exceptions.TelegramRetryAfter as e:
+            # Упёрлись в лимит правок — следующая правка всё равно покажет свежий хвост
+            run.dirty = True
+            await asyncio.sleep(e.retry_after)
+        except aiogram.exceptions.TelegramBadRequest as e:
+            if "message is not modified" not in str(e).lower():
+                logging.warning(f"Не удалось обновить вывод скрипта #{run.id}: {e}")
+
+    def _kill(self, run: ScriptRun):
+        # cmd/powershell запускают дочерние процессы — гасим всё дерево
+        try:
+            parent = psutil.Process(run.proc.get_pid())
+            for child in parent.children(recursive=True):
+                child.kill()
+            parent.kill()
+        except psutil.Error:
+            pass
+
+    def cancel(self, run_id: int) -> bool:
+        run = self.runs.get(run_id)
+        if not run or run.finished:
+            return False
+        run.cancelled = True
+        if run.proc and run.proc.get_returncode() is None:
+            self._kill(run)
+        return True
+
+script_runner = ScriptRunner(SCRIPT_MAX_PARALLEL)
+
+@dp.callback_query(F.data.startswith("script_stop:"))
+async def process_script_stop(callback: CallbackQuery):
+    if not has_access(callback):
+        return
+    run_id = int(callback.data.split(":", 1)[1])
+    if script_runner.cancel(run_id):
+        await callback.answer("Останавливаю…")
+        run = script_runner.runs[run_id]
+        if run.proc is None:
+            # Ещё ждал своей очереди — сообщаем сразу, не дожидаясь свободного слота
+            run.status = "⛔ отменён до запуска"
+            await script_runner.publish(run)
+    else:
+        await callback.answer("Скрипт уже завершён.")
+
+@dp.callback_query(F.data.startswith("script_log:"))
+async def process_script_log(callback: CallbackQuery):
+    if not has_access(callback):
+        return
+    run = script_runner.runs.get(int(callback.data.split(":", 1)[1]))
+    if not run or not run.log_path.exists():
+        await callback.answer("Лог уже удалён.", show_alert=True)
+        return
+    await callback.answer()
+    await bot.send_document(callback.from_user.id, input_file(run.log_path), caption=f"📜 {run.name}")
+
+# ==========================
+# БЫСТРЫЙ ЗАПУСК (ИНЛАЙН / /run)
+# ==========================
+
+KIND_LABELS = {'app': '📱', 'combo': '⌨️'}
+
+def _find_entry(kind: str, key: str):
+    data = apps_data if kind == 'app' else combos_data
+    return next((e for e in data if e['key'] == key and e.get('show_in_menu', True)), None)
+
+async def _run_entry(kind: str, key: str, chat_id: int) -> Optional[str]:
+    """Запускает приложение или комбинацию по ключу. Возвращает текст ответа."""
+    entry = _find_entry(kind, key)
+    if not entry:
+        return "Не найдено."
+    if kind == 'combo':
+        await execute_combo(entry, chat_id)
+        return None
+    if entry.get('type') == 'scene':
+        await run_scene(entry, chat_id)
+        return None
+    try:
+        return launch_app(entry, chat_id) or f"Запускаю: {entry['name']}"
+    except RuntimeError as e:
+        return str(e)
+
+@dp.message(Command("run"))
+async def run_command(message: Message):
+    if not has_access(message):
+        return
+    query = message.text.partition(' ')[2].strip()
+    if not query:
+        await message.answer("Использование: /run <название или ключ>")
+        return
+    # Точная ссылка вида app:cs2 / combo:screenshot (её шлёт инлайн-режим)
+    ref = re.fullmatch(r'(app|combo):(\S+)', query)
+    if ref:
+        hits = [(ref.group(1), ref.group(2), '')]
+    else:
+        hits = launch_index.search(query, limit=8)
+    if not hits:
+        await message.answer("Ничего не найдено.")
+        return
+    kind, key, _ = hits[0]
+    if ref or len(hits) == 1 or key.casefold() == query.casefold():
+        reply = await _run_entry(kind, key, message.chat.id)
+        if reply:
+            await message.answer(reply)
+        return
+    builder = InlineKeyboardBuilder()
+    for kind, key, name in hits:
+        prefix = "app_toggle_" if kind == 'app' else "combo_run_"
+        builder.button(text=f"{KIND_LABELS[kind]} {name}", callback_data=f"{prefix}{key}")
+    builder.adjust(1)
+    await message.answer("Найдено несколько вариантов:", reply_markup=builder.as_markup())
+
+@dp.inline_query()
+async def inline_launcher(inline_query: InlineQuery):
+    if not has_access(inline_query):
+        await inline_query.answer([], cache_time=5, is_personal=True)
+        return
+    results = [
+        InlineQueryResultArticle(
+            id=f"{kind}:{key}",
+            title=f"{KIND_LABELS[kind]} {name}",
+            description=key,
+            input_message_content=InputTextMessageContent(message_text=f"/run {kind}:{key}")
+        )
+        for kind, key, name in launch_index.search(inline_query.query, limit=20)
+    ]
+    await inline_query.answer(results, cache_time=0, is_personal=True)
+
+# ==========================
+# ФАЙЛОВЫЙ БРАУЗЕР
+# ==========================
+
+FB_PAGE_SIZE = 20
+FB_CACHE_DIRS = 32
+FB_MAX_IDS = 4096
+FB_UPLOAD_CHUNK = 256 * 1024
+
+def _human_size(size: int) -> str:
+    for unit in ("Б", "КБ", "МБ", "ГБ"):
+        if size < 1024 or unit == "ГБ":
+            return f"{size:.0f} {unit}" if unit == "Б" else f"{size:.1f} {unit}"
+        size /= 1024
+
+class DirListing:
+    """Содержимое папки: имена сортируются один раз, размеры/даты читаются только для открытых страниц."""
+
+    def __init__(self, path: Path, mtime_ns: int):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        with os.scandir(path) as it:
+            entries = []
+            for entry in it:
+                try:
+                    entries.append((entry.name, entry.is_dir()))
+                except OSError:
+                    continue
+        entries.sort(key=lambda e: (not e[1], e[0].casefold()))
+        self.entries = entries
+        self.meta: dict[str, Optional[tuple[int, float]]] = {}
+
+    def page(self, page: int) -> list[tuple[str, bool, Optional[tuple[int, float]]]]:
+        out = []
+        for name, is_dir in self.entries[page * FB_PAGE_SIZE:(page + 1) * FB_PAGE_SIZE]:
+            if not is_dir and name not in self.meta:
+                try:
+                    st = os.stat(self.path / name)
+                    self.meta[name] = (st.st_size, st.st_mtime)
+                except OSError:
+                    self.meta[name] = None
+            out.append((name, is_dir, self.meta.get(name)))
+        return out
+
+class FileBrowser:
+    """Кэш листингов (инвалидация по mtime папки) и короткие id путей для callback_data (лимит 64 байта)."""
+
+    def __init__(self, roots: list[Path]):
+        self.roots = roots
+        self.listings: OrderedDict[str, DirListing] = OrderedDict()
+        self.ids: OrderedDict[str, str] = OrderedDict()  # id → путь
+        self.rev: dict[str, str] = {}
+        self._next_id = 0
+
+    def path_id(self, path: Path) -> str:
+        key = str(path)
+        pid = self.rev.get(key)
+        if pid is None:
+            pid = format(self._next_id, 'x')
+            self._next_id += 1
+            self.ids[pid] = key
+            self.rev[key] = pid
+            if len(self.ids) > FB_MAX_IDS:
+                _, old = self.ids.popitem(last=False)
+                self.rev.pop(old, None)
+        else:
+            self.ids.move_to_end(pid)
+        return pid
+
+    def resolve(self, pid: str) -> Optional[Path]:
+        key = self.ids.get(pid)
+        if key is None:
+            return None
+        try:
+            # Ссылки и junction внутри корня не должны выводить за его пределы
+            path = Path(key).resolve(strict=True)
+        except (OSError, RuntimeError):
+            return None
+        return path if self.allowed(path) else None
+
+    def allowed(self, path: Path) -> bool:
+        """path должен быть уже разрешён через resolve()."""
+        return any(path == root or root in path.parents for root in self.roots)
+
+    def root_of(self, path: Path) -> bool:
+        return path in self.roots
+
+    def listing(self, path: Path) -> DirListing:
+        mtime_ns = os.stat(path).st_mtime_ns
+        key = str(path)
+        cached = self.listings.get(key)
+        if cached is not None and cached.mtime_ns == mtime_ns:
+            self.listings.move_to_end(key)
+            return cached
+        listing = DirListing(path, mtime_ns)
+        self.listings[key] = listing
+        self.listings.move_to_end(key)
+        if len(self.listings) > FB_CACHE_DIRS:
+            self.listings.popitem(last=False)
+        return listing
+
+file_browser = FileBrowser([Path(p.strip()).expanduser().resolve() for p in FILE_BROWSER_ROOTS.split(',') if p.strip()])
+
+def get_roots_keyboard():
+    builder = InlineKeyboardBuilder()
+    for root in file_browser.roots:
+        builder.button(text=f"📁 {root}", callback_data=f"fb_d:{file_browser.path_id(root)}:0")
+    builder.adjust(1)
+    return builder.as_markup()
+
+def get_dir_keyboard(path: Path, listing: DirListing, page: int, items):
+    builder = InlineKeyboardBuilder()
+    for name, is_dir, meta in items:
+        child_id = file_browser.path_id(path / name)
+        if is_dir:
+            builder.button(text=f"📁 {name}", callback_data=f"fb_d:{child_id}:0")
+        else:
+            size = f" ({_human_size(meta[0])})" if meta else ""
+            builder.button(text=f"📄 {name}{size}", callback_data=f"fb_f:{child_id}")
+    builder.adjust(1)
+    nav = []
+    if file_browser.root_of(path):
+        nav.append(InlineKeyboardButton(text="⬆️", callback_data="fb_roots"))
+    else:
+        nav.append(InlineKeyboardButton(text="⬆️", callback_data=f"fb_d:{file_browser.path_id(path.parent)}:0"))
+    total_pages = max(1, ceil(len(listing.entries) / FB_PAGE_SIZE))
+    if total_pages > 1:
+        dir_id = file_browser.path_id(path)
+        nav += [
+            InlineKeyboardButton(text="⬅️", callback_data=f"fb_d:{dir_id}:{(page - 1) % total_pages}"),
+            InlineKeyboardButton(text=f"{page + 1}/{total_pages}", callback_data="noop"),
+            InlineKeyboardButton(text="➡️", callback_data=f"fb_d:{dir_id}:{(page + 1) % total_pages}"),
+        ]
+    builder.row(*nav)
+    return builder.as_markup()
+
+@dp.message(Command("files"))
+async def show_file_roots(message: Message):
+    if not has_access(message):
+        return
+    if not file_browser.roots:
+        await message.answer("Папки для просмотра не заданы (FILE_BROWSER_ROOTS в config.ini).")
+        return
+    await message.answer("Выберите папку:", reply_markup=get_roots_keyboard())
+
+@dp.callback_query(F.data == "fb_roots")
+async def process_file_roots(callback: CallbackQuery):
+    if not has_access(callback):
+        return
+    await callback.message.edit_text("Выберите папку:", reply_markup=get_roots_keyboard())
+    await callback.answer()
+
+@dp.callback_query(F.data.startswith("fb_d:"))
+async def process_file_dir(callback: CallbackQuery):
+    if not has_access(callback):
+        return
+    pid, _, page = callback.data[len("fb_d:"):].partition(':')
+    path = file_browser.resolve(pid)
+    if path is None:
+        await callback.answer("Папка устарела — откройте /files заново.", show_alert=True)
+        return
+    try:
+        listing = await asyncio.to_thread(file_browser.listing, path)
+        total_pages = max(1, ceil(len(listing.entries) / FB_PAGE_SIZE))
+        page = min(int(page), total_pages - 1)
+        items = await asyncio.to_thread(listing.page, page)
+    except OSError as e:
+        await callback.answer(f"Не удалось открыть папку: {e}", show_alert=True)
+        return
+    try:
+        await callback.message.edit_text(f"📁 {path} ({len(listing.entries)})",
+                                         reply_markup=get_dir_keyboard(path, listing, page, items))
+    except aiogram.exceptions.TelegramBadRequest as e:
+        if "message is not modified" not in str(e).lower():
+            logging.warning(f"TelegramBadRequest при открытии папки: {e}")
+    await callback.answer()
+
+class ProgressInputFile(FSInputFile):
+    """FSInputFile, который считает отправленные байты — для сообщения о прогрессе."""
+
+    def __init__(self, path: Path, chunk_size: int = FB_UPLOAD_CHUNK):
+        super().__init__(path, chunk_size=chunk_size)
+        self.sent = 0
+
+    async def read(self, bot: Bot):
+        async for chunk in super().read(bot):
+            self.sent += len(chunk)
+            yield chunk
+
+async def _report_upload_progress(status: Message, name: str, upload: ProgressInputFile, total: int):
+    last = -1
+    while True:
+        await asyncio.sleep(low_impact.interval(2.0))
+        percent = upload.sent * 100 // max(total, 1)
+        if percent != last:
+            last = percent
+            try:
+                await status.edit_text(f"📤 {name}: {percent}% ({_human_size(upload.sent)} из {_human_size(total)})")
+            except aiogram.exceptions.TelegramBadRequest:
+                pass
+
+@dp.callback_query(F.data.startswith("fb_f:"))
+async def process_file_download(callback: CallbackQuery):
+    if not has_access(callback):
+        return
+    path = file_browser.resolve(callback.data[len("fb_f:"):])
+    if path is None or not path.is_file():
+        await callback.answer("Файл не найден.", show_alert=True)
+        return
+    size = path.stat().st_size
+    if size > MAX_UPLOAD_MB * 1024 * 1024:
+        await callback.answer(f"Файл больше {MAX_UPLOAD_MB} МБ — Telegram не примет.", show_alert=True)
+        return
+    await callback.answer()
+    chat_id = callback.from_user.id
+    if BOT_API_LOCAL or media_cache.known('document', path):
+        await send_cached('document', chat_id, path)
+        return
+    await low_impact.wait_heavy(chat_id, path.name)
+    upload = ProgressInputFile(path)
+    status = await bot.send_message(chat_id, f"📤 {path.name}: 0% (0 Б из {_human_size(size)})")
+    progress = asyncio.create_task(_report_upload_progress(status, path.name, upload, size))
+    try:
+        await send_cached('document', chat_id, path, upload=upload)
+        await status.delete()
+    except Exception as e:
+        await status.edit_text(f"Не удалось отправить {path.name}: {e}")
+    finally:
+        progress.cancel()
+
+# ==========================
+# ПРОФИЛИРОВАНИЕ
+# ==========================
+
+PROFILE_INTERVAL = 0.01   # шаг семплирования стека, секунды
+PROFILE_MAX_SECONDS = 120
+PROFILE_TOP = 30
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+class StackSampler:
+    """Семплирующий профилировщик: раз в interval снимает стеки всех потоков
+    через sys._current_frames(). Код бота не трогает, накладные расходы ~1% CPU."""
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.samples = 0
+        self.self_counts: Counter = Counter()
+        self.total_counts: Counter = Counter()
+        self.thread_counts: Counter = Counter()
+
+    def run(self, seconds: float):
+        own = threading.get_ident()
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                self.thread_counts[names.get(ident, str(ident))] += 1
+                self.self_counts[_frame_label(frame.f_code)] += 1
+                seen = set()
+                while frame is not None:
+                    label = _frame_label(frame.f_code)
+                    if label not in seen:
+                        seen.add(label)
+                        self.total_counts[label] += 1
+                    frame = frame.f_back
+            self.samples += 1
+            time.sleep(self.interval)
+
+    def report(self) -> str:
+        lines = [f"Сэмплов: {self.samples} (шаг {self.interval * 1000:.0f} мс)", "", "Потоки:"]
+        lines += [f"  {count:6d}  {name}" for name, count in self.thread_counts.most_common()]
+        for title, counts in (("CPU: собственное время (верх стека)", self.self_counts),
+                              ("CPU: накопительное время (функция в стеке)", self.total_counts)):
+            lines += ["", title]
+            for label, count in counts.most_common(PROFILE_TOP):
+                lines.append(f"  {count * 100 / max(self.samples, 1):5.1f}%  {label}")
+        return "\n".join(lines)
+
+def _start_tracemalloc() -> bool:
+    """Включает tracemalloc, если он ещё не включён. Возвращает True, если включили мы."""
+    if tracemalloc.is_tracing():
+        return False
+    tracemalloc.start()
+    return True
+
+def _memory_report(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot) -> str:
+    stats = after.compare_to(before, 'lineno')
+    lines = ["Память: изменение по строкам (tracemalloc)"]
+    for stat in stats[:PROFILE_TOP]:
+        frame = stat.traceback[0]
+        lines.append(f"  {stat.size_diff / 1024:+9.1f} КБ  {stat.count_diff:+6d} блоков  "
+                     f"{Path(frame.filename).name}:{frame.lineno}")
+    return "\n".join(lines)
+
+async def _send_report(chat_id: int, title: str, text: str):
+    name = f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.txt"
+    await bot.send_document(chat_id, BufferedInputFile(f"{title}\n\n{text}".encode('utf-8'), filename=name),
+                            caption=title)
+
+# Одновременно идёт только один профиль: cProfile и tracemalloc на весь процесс одни
+profiling = asyncio.Lock()
+
+async def profile_process(seconds: float) -> str:
+    proc = psutil.Process()
+    cpu_before = proc.cpu_times()
+    started_tm = _start_tracemalloc()
+    snap_before = tracemalloc.take_snapshot()
+    sampler = StackSampler(low_impact.interval(PROFILE_INTERVAL))
+    started = time.perf_counter()
+    try:
+        await asyncio.to_thread(sampler.run, seconds)
+        snap_after = tracemalloc.take_snapshot()
+    finally:
+        if started_tm:
+            tracemalloc.stop()
+    wall = time.perf_counter() - started
+    cpu_after = proc.cpu_times()
+    cpu_used = (cpu_after.user - cpu_before.user) + (cpu_after.system - cpu_before.system)
+    head = (f"CPU процесса: {cpu_used:.2f} с за {wall:.1f} с ({cpu_used * 100 / wall:.1f}% одного ядра), "
+            f"RSS: {proc.memory_info().rss / 1024 / 1024:.0f} МБ")
+    return "\n\n".join([head, sampler.report(), _memory_report(snap_before, snap_after)])
+
+class HandlerProfileMiddleware(BaseMiddleware):
+    """Профилирует cProfile + tracemalloc одно следующее выполнение выбранного хендлера."""
+
+    def __init__(self):
+        self.armed: dict[str, int] = {}  # имя хендлера → чат для отчёта
+        self._reports: set[asyncio.Task] = set()
+
+    async def __call__(self, handler, event, data: dict):
+        name = data['handler'].callback.__name__
+        if name not in self.armed or profiling.locked():
+            # Идёт другой профиль — этот вызов не профилируем, ждём следующего
+            return await handler(event, data)
+        chat_id = self.armed.pop(name)
+        async with profiling:
+            started_tm = _start_tracemalloc()
+            snap_before = tracemalloc.take_snapshot()
+            profiler = cProfile.Profile()
+            started = time.perf_counter()
+            try:
+                profiler.enable()
+                return await handler(event, data)
+            finally:
+                profiler.disable()
+                elapsed = time.perf_counter() - started
+                snap_after = tracemalloc.take_snapshot()
+                if started_tm:
+                    tracemalloc.stop()
+                out = io.StringIO()
+                pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(40)
+                note = ("Учтите: cProfile видит и другие задачи, выполнявшиеся, пока хендлер ждал (await), "
+                        "а память — все выделения процесса за это время.")
+                text = "\n\n".join([note, out.getvalue(), _memory_report(snap_before, snap_after)])
+                task = asyncio.create_task(_send_report(chat_id, f"Профиль {name}: {elapsed * 1000:.0f} мс", text))
+                self._reports.add(task)
+                task.add_done_callback(self._reports.discard)
+
+handler_profiler = HandlerProfileMiddleware()
+dp.message.middleware(handler_profiler)
+dp.callback_query.middleware(handler_profiler)
+
+def _handler_names() -> set[str]:
+    return {h.callback.__name__ for observer in (dp.message, dp.callback_query) for h in observer.handlers}
+
+@dp.message(Command("profile"))
+async def profile_command(message: Message):
+    if not has_access(message):
+        return
+    args = message.text.split()[1:]
+    if profiling.locked():
+        await message.answer("Уже идёт профилирование — дождитесь отчёта.")
+        return
+    if args[:1] == ['next']:
+        if len(args) != 2 or args[1] not in _handler_names():
+            await message.answer("Использование: /profile next <имя хендлера>, например toggle_app или run_combo.")
+            return
+        handler_profiler.armed[args[1]] = message.chat.id
+        await message.answer(f"Следующий вызов {args[1]} будет профилирован.")
+        return
+    try:
+        seconds = float(args[0]) if args else 10.0
+    except ValueError:
+        seconds = 0
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        await message.answer(f"Использование: /profile [секунды до {PROFILE_MAX_SECONDS}] или /profile next <хендлер>")
+        return
+    await message.answer(f"Профилирую {seconds:.0f} с…")
+    async with profiling:
+        report = await profile_process(seconds)
+    await _send_report(message.chat.id, f"Профиль процесса за {seconds:.0f} с", report)
+
 # ==========================
 # СИСТЕМНЫЕ ДЕЙСТВИЯ
 # ==========================
@@ -866,6 +3265,20 @@ async def set_commands():
     commands = [
         BotCommand(command="start", description="Запустить/перезапустить бота"),
         BotCommand(command="reload", description="Обновить данные из JSON"),
+        BotCommand(command="run", description="Быстрый запуск по названию"),
+        BotCommand(command="launches", description="Время запуска приложений"),
+        BotCommand(command="watches", description="Процессы, о завершении которых сообщу"),
+        BotCommand(command="journal", description="Сводка журнала действий за день"),
+        BotCommand(command="files", description="Файлы на ПК"),
+        BotCommand(command="remote", description="Тачпад и клавиатура"),
+        BotCommand(command="volume", description="Громкость и микшер (/volume 60 — задать уровень)"),
+        BotCommand(command="at", description="Выполнить в ЧЧ:ММ (daily — каждый день)"),
+        BotCommand(command="in", description="Выполнить через время"),
+        BotCommand(command="every", description="Выполнять с периодом"),
+        BotCommand(command="jobs", description="Запланированные задания"),
+        BotCommand(command="profile", description="Профиль CPU и памяти (/profile 10, /profile next toggle_app)"),
+        BotCommand(command="discover", description="Найти установленные программы и игры"),
+        BotCommand(command="lowimpact", description="Режим минимальной нагрузки во время игр"),
         BotCommand(command="end", description="Остановить бота"),
         BotCommand(command="editapps", description="Показать apps.json"),
         BotCommand(command="saveapps", description="Сохранить новый apps.json"),
@@ -976,6 +3389,23 @@ def media_prev():
     user32.keybd_event(VK_MEDIA_PREV_TRACK, 0, 0, 0)
     user32.keybd_event(VK_MEDIA_PREV_TRACK, 0, 2, 0)
 
+# Действия кнопок «Управление»: callback media_<ключ> и задания планировщика
+CONTROL_ACTIONS = {
+    'arrow_left': lambda: keyboard.send('left'),
+    'arrow_right': lambda: keyboard.send('right'),
+    'arrow_up': lambda: keyboard.send('up'),
+    'arrow_down': lambda: keyboard.send('down'),
+    'page_up': lambda: keyboard.send('page up'),
+    'page_down': lambda: keyboard.send('page down'),
+    'space': lambda: keyboard.send('space'),
+    'volume_up': volume_up,
+    'volume_down': volume_down,
+    'volume_mute': volume_mute,
+    'prev': media_prev,
+    'play_pause': media_play_pause,
+    'next': media_next,
+}
+
 def show_desktop_toggle():
     try:
         subprocess.run(
@@ -987,6 +3417,487 @@ def show_desktop_toggle():
     except Exception as e:
         logging.error(f"Win+D via PowerShell error: {e}")
 
+# ==========================
+# ГРОМКОСТЬ И МИКШЕР
+# ==========================
+
+# Бэкенды и клавиатуры — в volume.py: без Windows-импортов, проверяются на любой ОС
+audio = make_audio(AUDIO_BACKEND)
+mixer = Mixer(audio) if audio else None
+
+async def _show_volume(callback: CallbackQuery, view):
+    text, markup = view
+    try:
+        await callback.message.edit_text(text, reply_markup=markup)
+    except aiogram.exceptions.TelegramBadRequest as e:
+        if "message is not modified" not in str(e).lower():
+            logging.warning(f"TelegramBadRequest при обновлении громкости: {e}")
+
+@dp.message(Command("volume"))
+async def show_volume(message: Message):
+    if not has_access(message):
+        return
+    if mixer is None:
+        await message.answer("Микшер недоступен (подробности — в логе бота).")
+        return
+    arg = message.text.partition(' ')[2].strip().rstrip('%')
+    if arg.isdigit():
+        mixer.set_level(MASTER, int(arg))
+    text, markup = mixer.volume_view(MASTER)
+    await message.answer(text, reply_markup=markup)
+
+@dp.callback_query(F.data.startswith("vol_"))
+async def process_volume(callback: CallbackQuery):
+    if not has_access(callback):
+        return
+    if mixer is None:
+        await callback.answer("Микшер недоступен (подробности — в логе бота).", show_alert=True)
+        return
+    action, _, rest = callback.data.partition(':')
+    try:
+        if action == "vol_new":
+            text, markup = mixer.volume_view(MASTER)
+            await callback.message.answer(text, reply_markup=markup)
+        elif action == "vol_mixer":
+            await _show_volume(callback, mixer.mixer_view())
+        elif action == "vol_open":
+            await _show_volume(callback, mixer.volume_view(rest))
+        elif action == "vol_set":
+            level, _, target = rest.partition(':')
+            mixer.set_level(target, int(level))
+            await _show_volume(callback, mixer.volume_view(target))
+        elif action == "vol_mute":
+            muted, _, target = rest.partition(':')
+            mixer.set_mute(target, muted == '1')
+            await _show_volume(callback, mixer.volume_view(target))
+        await callback.answer()
+    except KeyError:
+        await callback.answer("Приложение больше не воспроизводит звук.", show_alert=True)
+        await _show_volume(callback, mixer.mixer_view())
+    except Exception as e:
+        await callback.answer(f"Ошибка: {e}", show_alert=True)
+
+# ==========================
+# ПУЛЬТ: ТАЧПАД И КЛАВИАТУРА (TELEGRAM WEB APP)
+# ==========================
+
+# Сервер, проверка входа и объединение событий — в remote.py (без Windows, проверяется тестами);
+# здесь — ввод в систему
+REMOTE_PAGE_PATH = APP_DIR / 'remote.html'
+
+MOUSEEVENTF_MOVE = 0x0001
+MOUSEEVENTF_LEFTDOWN, MOUSEEVENTF_LEFTUP = 0x0002, 0x0004
+MOUSEEVENTF_RIGHTDOWN, MOUSEEVENTF_RIGHTUP = 0x0008, 0x0010
+MOUSEEVENTF_MIDDLEDOWN, MOUSEEVENTF_MIDDLEUP = 0x0020, 0x0040
+MOUSEEVENTF_WHEEL = 0x0800
+WHEEL_DELTA = 120
+
+class Win32Input:
+    """Ввод в систему: мышь через mouse_event, клавиши через keyboard и медиа-клавиши бота."""
+
+    BUTTONS = {
+        'left': (MOUSEEVENTF_LEFTDOWN, MOUSEEVENTF_LEFTUP),
+        'right': (MOUSEEVENTF_RIGHTDOWN, MOUSEEVENTF_RIGHTUP),
+        'middle': (MOUSEEVENTF_MIDDLEDOWN, MOUSEEVENTF_MIDDLEUP),
+    }
+
+    def __init__(self):
+        self.user32 = ctypes.WinDLL('user32', use_last_error=True)
+        self.special_keys = {
+            'volume_up': volume_up, 'volume_down': volume_down, 'volume_mute': volume_mute,
+            'play_pause': media_play_pause, 'next': media_next, 'prev': media_prev,
+        }
+
+    def move(self, dx: int, dy: int):
+        self.user32.mouse_event(MOUSEEVENTF_MOVE, dx, dy, 0, 0)
+
+    def click(self, button: str):
+        down, up = self.BUTTONS[button]
+        self.user32.mouse_event(down, 0, 0, 0, 0)
+        self.user32.mouse_event(up, 0, 0, 0, 0)
+
+    def scroll(self, notches: float):
+        self.user32.mouse_event(MOUSEEVENTF_WHEEL, 0, 0, int(notches * WHEEL_DELTA), 0)
+
+    def key(self, name: str):
+        action = self.special_keys.get(name)
+        if action:
+            action()
+        else:
+            keyboard.send(name)
+
+    def text(self, text: str):
+        keyboard.write(text)
+
+remote_input = FakeInput() if INPUT_BACKEND == 'fake' else Win32Input()
+
+remote_server = RemoteServer(remote_input, BOT_TOKEN, USER_ID, REMOTE_PAGE_PATH)
+
+async def start_remote_server() -> Optional[web.AppRunner]:
+    if not WEBAPP_URL:
+        return None
+    runner = web.AppRunner(remote_server.make_app())
+    await runner.setup()
+    await web.TCPSite(runner, WEBAPP_HOST, WEBAPP_PORT).start()
+    logging.info(f"Пульт слушает {WEBAPP_HOST}:{WEBAPP_PORT}, внешний адрес {WEBAPP_URL}")
+    return runner
+
+@dp.message(Command("remote"))
+async def show_remote(message: Message):
+    if not has_access(message):
+        return
+    if not WEBAPP_URL:
+        await message.answer("Пульт не настроен: укажите WEBAPP_URL в config.ini.")
+        return
+    builder = InlineKeyboardBuilder()
+    builder.button(text="🖱 Открыть тачпад", web_app=WebAppInfo(url=WEBAPP_URL))
+    await message.answer("Тачпад и клавиатура:", reply_markup=builder.as_markup())
+
+# ==========================
+# ПЛАНИРОВЩИК ОТЛОЖЕННЫХ И ПОВТОРЯЮЩИХСЯ ДЕЙСТВИЙ
+# ==========================
+
+SCHEDULE_PATH = APP_DIR / 'schedule.json'
+SCHEDULE_MISSED_GRACE = 10 * 60   # пропущенное за время простоя разовое задание ещё выполняем
+SCHEDULE_MAX_SLEEP = 300          # периодически сверяемся с часами (сон ПК, перевод времени)
+
+DURATION_UNITS = {'d': 86400, 'д': 86400, 'h': 3600, 'ч': 3600, 'm': 60, 'м': 60, 's': 1, 'с': 1}
+
+def parse_duration(text: str) -> Optional[int]:
+    """«40m», «1h30m», «90s», «2ч» → секунды."""
+    parts = re.findall(r'(\d+)\s*([dдhчmмsс])', text.lower())
+    if not parts or re.sub(r'(\d+)\s*([dдhчmмsс])', '', text.lower()).strip():
+        return None
+    return sum(int(n) * DURATION_UNITS[u] for n, u in parts)
+
+def _human_duration(seconds: int) -> str:
+    out = []
+    for unit, size in (("д", 86400), ("ч", 3600), ("мин", 60), ("с", 1)):
+        if seconds >= size:
+            out.append(f"{seconds // size} {unit}")
+            seconds %= size
+    return " ".join(out) or "0 с"
+
+def parse_action(text: str) -> Optional[str]:
+    """Действие задания: app:<key>, combo:<key>, media:<кнопка>, close:<key> или точное
+    название/ключ приложения или комбинации. Похожие названия не угадываются — см. action_candidates."""
+    text = text.strip()
+    m = re.fullmatch(r'(app|combo|media|close):(\S+)', text)
+    if m:
+        kind, key = m.groups()
+        if kind == 'media':
+            return text if key in CONTROL_ACTIONS else None
+        if kind == 'close':
+            return text if any(e['key'] == key for e in apps_data) else None
+        return text if _find_entry(kind, key) else None
+    exact = launch_index.exact(text)
+    return f"{exact[0][0]}:{exact[0][1]}" if len(exact) == 1 else None
+
+def action_candidates(text: str) -> list[tuple[str, str, str]]:
+    """Варианты (kind, key, name) для выбора кнопкой, когда parse_action не уверен."""
+    return launch_index.exact(text) or launch_index.search(text, limit=8)
+
+def describe_action(action: str) -> str:
+    kind, _, key = action.partition(':')
+    if kind == 'media':
+        return f"кнопка {key}"
+    data = combos_data if kind == 'combo' else apps_data
+    name = next((e.get('name', key) for e in data if e['key'] == key), key)
+    return f"закрыть {name}" if kind == 'close' else name
+
+def close_app(app_info) -> int:
+    """Завершает процессы приложения. Возвращает число завершённых процессов."""
+    exe_name = _app_exe_name(app_info)
+    if not exe_name:
+        raise RuntimeError("не известно имя процесса (поле exe в apps.json)")
+    procs = [p for p in psutil.process_iter(['name']) if (p.info['name'] or '').lower() == exe_name]
+    for p in procs:
+        try:
+            p.terminate()
+        except psutil.Error:
+            pass
+    return len(procs)
+
+async def run_action(action: str, chat_id: int) -> Optional[str]:
+    """Выполняет действие задания. Возвращает текст для чата (или None)."""
+    kind, _, key = action.partition(':')
+    if kind == 'media':
+        CONTROL_ACTIONS[key]()
+        return None
+    if kind == 'close':
+        app_info = next((a for a in apps_data if a['key'] == key), None)
+        if not app_info:
+            return "Приложение не найдено."
+        count = await asyncio.to_thread(close_app, app_info)
+        return f"Закрыто процессов: {count}" if count else "Приложение не запущено."
+    return await _run_entry(kind, key, chat_id)
+
+class Scheduler:
+    """Все задания в одной куче по времени срабатывания и одна задача asyncio,
+    которая спит до ближайшего срока. Добавление более раннего задания будит её.
+    Отменённые задания удаляются из словаря, а их записи в куче пропускаются."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.jobs: dict[int, dict] = {}
+        self.heap: list[tuple[float, int]] = []
+        self._next_id = 1
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running: set[asyncio.Task] = set()
+        self._save_handle: Optional[asyncio.TimerHandle] = None
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                jobs = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, json.JSONDecodeError) as e:
+            logging.error(f"Ошибка загрузки {self.path.name}: {e}")
+            return
+        now = time.time()
+        for job in jobs:
+            if job['due'] < now:
+                if job.get('every'):
+                    missed = ceil((now - job['due']) / job['every'])
+                    job['due'] += missed * job['every']
+                elif now - job['due'] > SCHEDULE_MISSED_GRACE:
+                    logging.warning(f"Задание #{job['id']} пропущено: бот не работал в {job['due']}")
+                    continue
+            self.jobs[job['id']] = job
+            heapq.heappush(self.heap, (job['due'], job['id']))
+            self._next_id = max(self._next_id, job['id'] + 1)
+
+    def save(self):
+        tmp = self.path.with_suffix('.tmp')
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(list(self.jobs.values()), f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logging.error(f"Ошибка сохранения {self.path.name}: {e}")
+
+    def _save_soon(self):
+        """Сохраняет не чаще раза в секунду — пачка изменений пишется на диск одним файлом."""
+        if self._save_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.save()
+            return
+        self._save_handle = loop.call_later(1.0, self._flush)
+
+    def _flush(self):
+        self._save_handle = None
+        self.save()
+
+    def add(self, action: str, due: float, chat_id: int, every: Optional[int] = None) -> dict:
+        job = {'id': self._next_id, 'action': action, 'due': due, 'every': every, 'chat_id': chat_id}
+        self._next_id += 1
+        self.jobs[job['id']] = job
+        heapq.heappush(self.heap, (due, job['id']))
+        self._save_soon()
+        if self._wakeup and self.heap[0][1] == job['id']:
+            self._wakeup.set()
+        return job
+
+    def cancel(self, job_id: int) -> bool:
+        if self.jobs.pop(job_id, None) is None:
+            return False
+        self._save_soon()
+        return True
+
+    def upcoming(self) -> list[dict]:
+        return sorted(self.jobs.values(), key=lambda j: j['due'])
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._loop())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+        if self._save_handle is not None:
+            self._save_handle.cancel()
+            self._flush()
+
+    def _is_live(self, due: float, job_id: int) -> bool:
+        job = self.jobs.get(job_id)
+        return job is not None and job['due'] == due
+
+    async def _loop(self):
+        while True:
+            while self.heap and not self._is_live(*self.heap[0]):
+                heapq.heappop(self.heap)
+            timeout = SCHEDULE_MAX_SLEEP
+            if self.heap:
+                timeout = min(timeout, max(0.0, self.heap[0][0] - time.time()))
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            now = time.time()
+            fired = False
+            while self.heap and self.heap[0][0] <= now:
+                due, job_id = heapq.heappop(self.heap)
+                if not self._is_live(due, job_id):
+                    continue
+                job = self.jobs[job_id]
+                if job['every']:
+                    job['due'] = due + ceil((now - due + 1) / job['every']) * job['every']
+                    heapq.heappush(self.heap, (job['due'], job_id))
+                else:
+                    del self.jobs[job_id]
+                fired = True
+                task = asyncio.create_task(self._fire(dict(job)))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+            if fired:
+                self._save_soon()
+
+    async def _fire(self, job: dict):
+        started = time.perf_counter()
+        try:
+            reply = await run_action(job['action'], job['chat_id'])
+            journal_action(f"job:{job['action']}", time.perf_counter() - started, 'ok', job_id=job['id'])
+            if reply:
+                await bot.send_message(job['chat_id'], f"⏰ #{job['id']} {describe_action(job['action'])}: {reply}")
+        except Exception as e:
+            journal_action(f"job:{job['action']}", time.perf_counter() - started, 'error',
+                           job_id=job['id'], error=f"{type(e).__name__}: {e}")
+            logging.error(f"Ошибка задания #{job['id']} ({job['action']}): {e}")
+            try:
+                await bot.send_message(job['chat_id'], f"⏰ #{job['id']} {describe_action(job['action'])}: ошибка {e}")
+            except Exception:
+                pass
+
+scheduler = Scheduler(SCHEDULE_PATH)
+scheduler.load()
+
+def _job_line(job: dict) -> str:
+    when = datetime.fromtimestamp(job['due']).strftime('%d.%m %H:%M:%S')
+    repeat = f" (каждые {_human_duration(job['every'])})" if job['every'] else ""
+    return f"#{job['id']} {when}{repeat} — {describe_action(job['action'])}"
+
+JOB_PICK_MAX = 32   # сколько неотвеченных «уточните действие» помнить
+
+job_picks: OrderedDict[int, tuple[list[str], float, Optional[int]]] = OrderedDict()  # id → (действия, срок, период)
+_next_pick_id = 0
+
+async def _schedule(message: Message, action_text: str, due: float, every: Optional[int] = None):
+    """Планирует действие, а если название неточное — предлагает варианты кнопками (как /run)."""
+    global _next_pick_id
+    action = parse_action(action_text)
+    if action:
+        job = scheduler.add(action, due, message.chat.id, every=every)
+        await message.answer(f"Запланировано: {_job_line(job)}")
+        return
+    hits = action_candidates(action_text)
+    if not hits:
+        await message.answer(f"Действие «{action_text}» не найдено.\n"
+                             "Укажите app:<key>, combo:<key>, media:<кнопка>, close:<key> или точное название.")
+        return
+    pick_id = _next_pick_id
+    _next_pick_id += 1
+    job_picks[pick_id] = ([f"{kind}:{key}" for kind, key, _ in hits], due, every)
+    if len(job_picks) > JOB_PICK_MAX:
+        job_picks.popitem(last=False)
+    builder = InlineKeyboardBuilder()
+    for i, (kind, key, name) in enumerate(hits):
+        builder.button(text=f"{KIND_LABELS[kind]} {name}", callback_data=f"job_pick:{pick_id}:{i}")
+    builder.adjust(1)
+    await message.answer(f"Точного совпадения для «{action_text}» нет. Что запланировать?",
+                         reply_markup=builder.as_markup())
+
+@dp.callback_query(F.data.startswith("job_pick:"))
+async def pick_job_action(callback: CallbackQuery):
+    if not has_access(callback):
+        return
+    _, pick_id, index = callback.data.split(":")
+    pick = job_picks.pop(int(pick_id), None)
+    if pick is None:
+        await callback.answer("Выбор устарел — повторите команду.", show_alert=True)
+        return
+    actions, due, every = pick
+    job = scheduler.add(actions[int(index)], due, callback.message.chat.id, every=every)
+    await callback.answer()
+    await callback.message.edit_text(f"Запланировано: {_job_line(job)}")
+
+@dp.message(Command("in"))
+async def schedule_in(message: Message):
+    if not has_access(message):
+        return
+    delay_text, _, action_text = message.text.partition(' ')[2].strip().partition(' ')
+    delay = parse_duration(delay_text)
+    if not delay or not action_text:
+        await message.answer("Использование: /in <40m|1h30m|90s> <действие>\n"
+                             "Действие: app:<key>, combo:<key>, media:<кнопка>, close:<key> или название.")
+        return
+    await _schedule(message, action_text, time.time() + delay)
+
+@dp.message(Command("every"))
+async def schedule_every(message: Message):
+    if not has_access(message):
+        return
+    period_text, _, action_text = message.text.partition(' ')[2].strip().partition(' ')
+    period = parse_duration(period_text)
+    if not period or period < 10 or not action_text:
+        await message.answer("Использование: /every <5m|1h|1d> <действие> (период не меньше 10 с)")
+        return
+    await _schedule(message, action_text, time.time() + period, every=period)
+
+@dp.message(Command("at"))
+async def schedule_at(message: Message):
+    if not has_access(message):
+        return
+    m = re.fullmatch(r'(\d{1,2}):(\d{2})\s+(?:(daily|ежедневно)\s+)?(.+)', message.text.partition(' ')[2].strip(), re.I)
+    if not m or int(m.group(1)) > 23 or int(m.group(2)) > 59:
+        await message.answer("Использование: /at <ЧЧ:ММ> [daily] <действие>")
+        return
+    now = datetime.now()
+    due = now.replace(hour=int(m.group(1)), minute=int(m.group(2)), second=0, microsecond=0)
+    if due <= now:
+        due += timedelta(days=1)
+    every = 86400 if m.group(3) else None
+    await _schedule(message, m.group(4), due.timestamp(), every=every)
+
+def get_jobs_keyboard():
+    builder = InlineKeyboardBuilder()
+    for job in scheduler.upcoming()[:20]:
+        builder.button(text=f"❌ #{job['id']}", callback_data=f"job_cancel_{job['id']}")
+    builder.adjust(4)
+    return builder.as_markup()
+
+def _jobs_text() -> str:
+    jobs = scheduler.upcoming()
+    if not jobs:
+        return "Запланированных заданий нет."
+    lines = [_job_line(job) for job in jobs[:20]]
+    if len(jobs) > 20:
+        lines.append(f"…и ещё {len(jobs) - 20}")
+    return "Задания (❌ — отменить):\n" + "\n".join(lines)
+
+@dp.message(Command("jobs"))
+async def show_jobs(message: Message):
+    if not has_access(message):
+        return
+    await message.answer(_jobs_text(), reply_markup=get_jobs_keyboard())
+
+@dp.callback_query(F.data.startswith("job_cancel_"))
+async def cancel_job(callback: CallbackQuery):
+    if not has_access(callback):
+        return
+    job_id = int(callback.data[len("job_cancel_"):])
+    cancelled = scheduler.cancel(job_id)
+    try:
+        await callback.message.edit_text(_jobs_text(), reply_markup=get_jobs_keyboard())
+    except aiogram.exceptions.TelegramBadRequest:
+        pass
+    await callback.answer(f"Задание #{job_id} отменено." if cancelled else "Задание уже выполнено или отменено.")
+
 # ==========================
 # ПРОЧИЕ СООБЩЕНИЯ / ПОИСК
 # ==========================
@@ -1000,7 +3911,7 @@ async def handle_other_messages(message: Message):
     if url_match:
         url = url_match.group(1)
         try:
-            os.startfile(url)
+            _open_with_shell(url)
             await message.reply(f"Ссылка открыта: {url}")
         except Exception as e:
             await message.reply(f"Ошибка открытия ссылки: {e}")
@@ -1017,7 +3928,7 @@ async def handle_other_messages(message: Message):
                 browser_path = _resolve_path(browser_app_info['path'])
                 browser_args = _as_list(browser_app_info.get('args')) or _as_list(browser_app_info.get('arg'))
                 try:
-                    subprocess.Popen([browser_path] + browser_args + [search_url], shell=False)
+                    _run_exe(browser_path, browser_args + [search_url])
                     await message.reply(f"Ищу в {browser_app_info['name']}: {text}")
                     return
                 except Exception as e:
@@ -1025,7 +3936,7 @@ async def handle_other_messages(message: Message):
                     user_data['preferred_search_browser_key'] = None
                     save_config_setting('Settings', 'PREFERRED_SEARCH_BROWSER_KEY', '')
         try:
-            os.startfile(search_url)
+            _open_with_shell(search_url)
             await message.reply(f"Ищу в браузере по умолчанию: {text}")
         except Exception as e:
             await message.reply(f"Ошибка выполнения поиска: {e}")
@@ -1034,12 +3945,38 @@ async def handle_other_messages(message: Message):
 # ЗАПУСК ПОЛЛИНГА
 # ==========================
 
+def _log_discovery(task: asyncio.Task):
+    if not task.cancelled() and task.exception():
+        logging.error("Ошибка фонового поиска программ", exc_info=task.exception())
+
 async def main():
     await set_commands()
-    await dp.start_polling(bot)
+    launch_tracker.start(asyncio.get_running_loop())
+    process_watcher.start(asyncio.get_running_loop())
+    low_impact.apply()
+    # Индекс программ обновляется в фоне; по кэшу без изменений это доли секунды
+    discovery = asyncio.create_task(asyncio.to_thread(app_discovery.rescan))
+    discovery.add_done_callback(_log_discovery)
+    remote_runner = await start_remote_server()
+    scheduler.start()
+    try:
+        await dp.start_polling(bot)
+    finally:
+        discovery.cancel()
+        scheduler.stop()
+        launch_tracker.stop()
+        process_watcher.stop()
+        low_impact.stop()
+        if remote_runner:
+            await remote_runner.cleanup()
 
 if __name__ == '__main__':
+    for listener in log_listeners:
+        listener.start()
     try:
         asyncio.run(main())
     except (KeyboardInterrupt, SystemExit):
         logging.info("Бот остановлен.")
+    finally:
+        for listener in log_listeners:
+            listener.stop()
@@ -0,0 +1,24 @@
+"""Сессия Bot API и файлы для отправки: облачный Bot API или локальный сервер telegram-bot-api.
+
+Без Windows-импортов — проверяется на любой ОС против подставного сервера (tests/test_botapi.py).
+"""
+
+from pathlib import Path
+
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
+from aiogram.types import FSInputFile
+
+def make_session(api_url: str = '', local: bool = False, pool_size: int = 100,
+                 keepalive: float = 15.0, timeout: float = 60.0) -> AiohttpSession:
+    api = TelegramAPIServer.from_base(api_url, is_local=local) if api_url else PRODUCTION
+    session = AiohttpSession(api=api, limit=pool_size, timeout=timeout)
+    # aiogram не пробрасывает keep-alive наружу — дописываем в параметры TCPConnector
+    session._connector_init['keepalive_timeout'] = keepalive
+    return session
+
+def file_ref(path: Path, local: bool):
+    """Файл для отправки: локальному Bot API — ссылкой на путь (без повторной загрузки), иначе — загрузкой."""
+    if local:
+        return Path(path).resolve().as_uri()
+    return FSInputFile(path)
@@ -1 +1 @@
-pip install --upgrade pip && pip install "aiogram>=3" psutil pyautogui keyboard pillow pywin32
+pip install --upgrade pip && pip install "aiogram>=3" psutil pyautogui keyboard pillow pywin32 pycaw
@@ -0,0 +1,140 @@
+"""Пульт (Telegram Web App): страница тачпада, WebSocket, проверка входа и объединение событий.
+
+Ввод в систему выполняет бэкенд (Win32Input в NeDja.py или FakeInput отсюда), поэтому
+модуль не зависит от Windows и проверяется на любой ОС (tests/test_remote.py).
+"""
+
+import asyncio
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Optional
+
+from aiohttp import WSMsgType, web
+from aiogram.utils.web_app import safe_parse_webapp_init_data
+
+REMOTE_MOVE_FLUSH = 0.008  # не чаще одного движения курсора за ~8 мс
+REMOTE_AUTH_TIMEOUT = 5.0
+REMOTE_AUTH_MAX_AGE = 24 * 3600
+
+class FakeInput:
+    """Ввод-заглушка: только запоминает события (INPUT_BACKEND = fake, тесты)."""
+
+    def __init__(self):
+        self.events: list[tuple] = []
+
+    def move(self, dx: int, dy: int):
+        self.events.append(('move', dx, dy))
+
+    def click(self, button: str):
+        self.events.append(('click', button))
+
+    def scroll(self, notches: float):
+        self.events.append(('scroll', notches))
+
+    def key(self, name: str):
+        self.events.append(('key', name))
+
+    def text(self, text: str):
+        self.events.append(('text', text))
+
+class RemoteSession:
+    """Одно подключение пульта. Сдвиги мыши и прокрутки суммируются и применяются
+    не чаще REMOTE_MOVE_FLUSH; любое другое событие сперва сбрасывает накопленное,
+    чтобы порядок «подвинул → кликнул» сохранялся."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.dx = self.dy = 0
+        self.scroll = 0.0
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+    def flush(self):
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self.dx or self.dy:
+            self.backend.move(self.dx, self.dy)
+            self.dx = self.dy = 0
+        if self.scroll:
+            self.backend.scroll(self.scroll)
+            self.scroll = 0.0
+
+    def handle(self, event: dict):
+        kind = event.get('t')
+        if kind in ('move', 'scroll'):
+            if kind == 'move':
+                self.dx += int(event.get('dx', 0))
+                self.dy += int(event.get('dy', 0))
+            else:
+                self.scroll += float(event.get('dy', 0))
+            if self._flush_handle is None:
+                self._flush_handle = asyncio.get_running_loop().call_later(REMOTE_MOVE_FLUSH, self.flush)
+            return
+        self.flush()
+        if kind == 'click':
+            self.backend.click(str(event.get('b', 'left')))
+        elif kind == 'key':
+            self.backend.key(str(event['k']))
+        elif kind == 'text':
+            self.backend.text(str(event['s']))
+
+class RemoteServer:
+    """Страница тачпада и WebSocket пульта. Первое сообщение сокета — initData Web App:
+    без подписи токеном бота или не от владельца (user_id) соединение закрывается с 4401."""
+
+    def __init__(self, backend, token: str, user_id: int, page_path: Path):
+        self.backend = backend
+        self.token = token
+        self.user_id = user_id
+        self.page_path = page_path
+
+    def check_auth(self, init_data: str) -> bool:
+        try:
+            data = safe_parse_webapp_init_data(self.token, init_data)
+        except ValueError:
+            return False
+        if data.user is None or data.user.id != self.user_id:
+            return False
+        return time.time() - data.auth_date.timestamp() < REMOTE_AUTH_MAX_AGE
+
+    async def page(self, request: web.Request):
+        return web.FileResponse(self.page_path)
+
+    async def ws(self, request: web.Request):
+        ws = web.WebSocketResponse(heartbeat=20)
+        await ws.prepare(request)
+        try:
+            hello = await ws.receive_json(timeout=REMOTE_AUTH_TIMEOUT)
+            authorized = hello.get('t') == 'auth' and self.check_auth(str(hello.get('init_data', '')))
+        except (asyncio.TimeoutError, TypeError, ValueError, AttributeError):
+            authorized = False
+        if not authorized:
+            logging.warning(f"Пульт: отклонено подключение с {request.remote}")
+            await ws.close(code=4401, message=b'unauthorized')
+            return ws
+
+        session = RemoteSession(self.backend)
+        await ws.send_json({'t': 'ready'})
+        logging.info(f"Пульт подключён с {request.remote}")
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                try:
+                    payload = json.loads(msg.data)
+                    for event in payload if isinstance(payload, list) else [payload]:
+                        session.handle(event)
+                except Exception as e:
+                    logging.warning(f"Пульт: ошибка обработки события {msg.data[:100]!r}: {e}")
+        finally:
+            session.flush()
+            logging.info("Пульт отключён.")
+        return ws
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/remote', self.page)
+        app.router.add_get('/remote/ws', self.ws)
+        return app
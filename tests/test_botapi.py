@@ -0,0 +1,59 @@
+import asyncio
+import sys
+from pathlib import Path
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from aiogram import Bot
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from botapi import file_ref, make_session
+
+def send_document(tmp_path: Path, local: bool):
+    """Отправляет файл через подставной Bot API и возвращает (поле document, коннектор)."""
+    path = tmp_path / "log.txt"
+    path.write_text("hello", encoding='utf-8')
+    received = {}
+
+    async def handler(request: web.Request):
+        form = await request.post()
+        received['method'] = request.match_info['method']
+        received['document'] = form['document']
+        received['files'] = {name: (part.filename, part.file.read())
+                             for name, part in form.items() if isinstance(part, web.FileField)}
+        return web.json_response({"ok": True, "result": {
+            "message_id": 1, "date": 0, "chat": {"id": 1, "type": "private"}}})
+
+    async def run():
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', handler)
+        async with TestServer(app) as server:
+            session = make_session(str(server.make_url('')).rstrip('/'), local, pool_size=7, keepalive=42.0)
+            bot = Bot(token="42:TEST", session=session)
+            try:
+                await bot.send_document(1, file_ref(path, local))
+                connector = (await session.create_session()).connector
+            finally:
+                await session.close()
+        return received, connector
+
+    return asyncio.run(run()), path
+
+def test_local_mode_sends_file_uri(tmp_path):
+    (received, _), path = send_document(tmp_path, local=True)
+    assert received['method'] == 'sendDocument'
+    assert received['document'] == path.resolve().as_uri()
+    assert received['document'].startswith('file://')
+
+def test_cloud_mode_uploads_multipart(tmp_path):
+    (received, _), _ = send_document(tmp_path, local=False)
+    assert received['document'].startswith('attach://')
+    attached = received['document'][len('attach://'):]
+    assert received['files'] == {attached: ("log.txt", b"hello")}
+
+def test_pool_and_keepalive_reach_connector(tmp_path):
+    (_, connector), _ = send_document(tmp_path, local=False)
+    assert connector.limit == 7
+    # Ключ ставится через приватный _connector_init aiogram — тест ловит поломку при обновлении
+    assert connector._keepalive_timeout == 42.0
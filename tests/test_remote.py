@@ -0,0 +1,75 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import sys
+import time
+from pathlib import Path
+from urllib.parse import urlencode
+
+import pytest
+from aiohttp import WSMsgType
+from aiohttp.test_utils import TestClient, TestServer
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from remote import REMOTE_MOVE_FLUSH, FakeInput, RemoteServer
+
+TOKEN = "42:TEST"
+OWNER = 1001
+
+def init_data(user_id: int, token: str = TOKEN) -> str:
+    """initData, подписанный как это делает Telegram для Web App."""
+    fields = {'auth_date': str(int(time.time())), 'query_id': 'AAE',
+              'user': json.dumps({'id': user_id, 'first_name': 'Test'})}
+    check = "\n".join(f"{k}={v}" for k, v in sorted(fields.items()))
+    secret = hmac.new(b"WebAppData", token.encode(), hashlib.sha256).digest()
+    fields['hash'] = hmac.new(secret, check.encode(), hashlib.sha256).hexdigest()
+    return urlencode(fields)
+
+def run_remote(init: str, batches: list) -> tuple[FakeInput, list]:
+    """Подключается к пульту, шлёт пачки событий и возвращает (бэкенд, ответы сервера)."""
+    backend = FakeInput()
+    server = RemoteServer(backend, TOKEN, OWNER, Path(__file__))
+
+    async def run():
+        replies = []
+        async with TestClient(TestServer(server.make_app())) as client:
+            ws = await client.ws_connect('/remote/ws')
+            await ws.send_json({'t': 'auth', 'init_data': init})
+            reply = await ws.receive()
+            replies.append(reply.json() if reply.type == WSMsgType.TEXT else ws.close_code)
+            if reply.type == WSMsgType.TEXT:
+                for batch in batches:
+                    await ws.send_json(batch)
+                await asyncio.sleep(REMOTE_MOVE_FLUSH * 5)
+                await ws.close()
+                await asyncio.sleep(0.05)
+        return replies
+
+    return backend, asyncio.run(run())
+
+def test_owner_is_accepted_and_event_order_kept():
+    backend, replies = run_remote(init_data(OWNER), [
+        [{'t': 'move', 'dx': 3, 'dy': 1}, {'t': 'move', 'dx': 2, 'dy': -1}],
+        {'t': 'click', 'b': 'left'},
+        [{'t': 'scroll', 'dy': 0.5}, {'t': 'key', 'k': 'enter'}, {'t': 'move', 'dx': -4, 'dy': 0}],
+        {'t': 'text', 's': 'привет'},
+    ])
+    assert replies == [{'t': 'ready'}]
+    # Сдвиги до клика сложены в один, и клик пришёл после них
+    assert backend.events == [
+        ('move', 5, 0), ('click', 'left'),
+        ('scroll', 0.5), ('key', 'enter'),
+        ('move', -4, 0), ('text', 'привет'),
+    ]
+
+@pytest.mark.parametrize('init', [
+    init_data(OWNER, token="43:OTHER"),  # подпись чужим токеном
+    init_data(2002),                     # подписано верно, но не владелец
+    init_data(OWNER).replace('Test', 'Evil'),
+])
+def test_forged_init_data_is_rejected(init):
+    backend, replies = run_remote(init, [{'t': 'click', 'b': 'left'}])
+    assert replies == [4401]
+    assert backend.events == []
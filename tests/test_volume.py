@@ -0,0 +1,72 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from volume import MASTER, SYSTEM_SOUNDS, FakeAudio, Mixer, make_audio
+
+
+def buttons(markup):
+    return {b.text: b.callback_data for row in markup.inline_keyboard for b in row}
+
+
+@pytest.fixture
+def mixer():
+    return Mixer(make_audio('fake'))
+
+
+def test_fake_backend_selected():
+    assert isinstance(make_audio('fake'), FakeAudio)
+
+
+def test_master_view_and_presets(mixer):
+    text, markup = mixer.volume_view(MASTER)
+    assert "Общая громкость: 50%" in text
+    data = buttons(markup)
+    assert data["•50"] == "vol_set:50:master"
+    assert data["+10"] == "vol_set:60:master"
+    assert data["🎚 Микшер"] == "vol_mixer"
+
+    mixer.set_level(MASTER, 130)
+    assert mixer.get_level(MASTER) == (100, False)
+    mixer.set_mute(MASTER, True)
+    assert "(без звука)" in mixer.volume_view(MASTER)[0]
+
+
+def test_mixer_opens_session_by_short_id(mixer):
+    _, markup = mixer.mixer_view()
+    data = buttons(markup)
+    chrome = data["🔊 chrome.exe — 80%"]
+    assert data["🔊 Системные звуки — 60%"].startswith("vol_open:")
+
+    tid = chrome.split(':', 1)[1]
+    text, markup = mixer.volume_view(tid)
+    assert text.startswith("🔊 chrome.exe: 80%")
+    mixer.set_level(tid, 25)
+    mixer.set_mute(tid, True)
+    assert mixer.backend.apps['chrome.exe'] == [25, True]
+    assert buttons(markup)["⬅️ Общая"] == "vol_open:master"
+    assert mixer.backend.apps[SYSTEM_SOUNDS] == [60, False]
+
+
+def test_long_session_name_fits_callback_data(mixer):
+    long_name = "a" * 100 + ".exe"
+    mixer.backend.apps[long_name] = [40, False]
+    _, markup = mixer.mixer_view()
+    for callback_data in buttons(markup).values():
+        assert len(callback_data.encode('utf-8')) <= 64
+    tid = mixer.target_id(long_name)
+    assert mixer.volume_view(tid)[0].startswith(f"🔊 {long_name}: 40%")
+    for callback_data in buttons(mixer.volume_view(tid)[1]).values():
+        assert len(callback_data.encode('utf-8')) <= 64
+
+
+def test_stale_ids_raise_key_error(mixer):
+    with pytest.raises(KeyError):
+        mixer.volume_view("ff")
+    tid = mixer.target_id('cs2.exe')
+    del mixer.backend.apps['cs2.exe']
+    with pytest.raises(KeyError):
+        mixer.get_level(tid)
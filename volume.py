@@ -0,0 +1,188 @@
+"""Громкость и микшер: бэкенды (pycaw / заглушка в памяти) и клавиатуры для NeDja.py.
+
+Windows-библиотеки импортируются только внутри PycawAudio, поэтому FakeAudio
+и клавиатуры работают и проверяются на любой ОС (tests/test_volume.py).
+"""
+
+import logging
+from collections import OrderedDict
+from typing import Optional
+
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+VOLUME_PRESETS = (0, 10, 25, 50, 75, 100)
+VOLUME_STEPS = (-10, -5, 5, 10)
+SYSTEM_SOUNDS = 'system'
+MASTER = 'master'
+MIXER_MAX_IDS = 256
+
+class PycawAudio:
+    """Громкость через Windows Core Audio (pycaw): общий уровень и сессии приложений."""
+
+    def __init__(self):
+        from pycaw.pycaw import AudioUtilities
+        self.utils = AudioUtilities
+        speakers = AudioUtilities.GetSpeakers()
+        if hasattr(speakers, 'EndpointVolume'):
+            # pycaw 2024+: GetSpeakers() возвращает обёртку AudioDevice
+            self.endpoint = speakers.EndpointVolume
+        else:
+            import ctypes
+            from comtypes import CLSCTX_ALL
+            from pycaw.pycaw import IAudioEndpointVolume
+            interface = speakers.Activate(IAudioEndpointVolume._iid_, CLSCTX_ALL, None)
+            self.endpoint = ctypes.cast(interface, ctypes.POINTER(IAudioEndpointVolume))
+
+    def get_master(self) -> tuple[int, bool]:
+        return round(self.endpoint.GetMasterVolumeLevelScalar() * 100), bool(self.endpoint.GetMute())
+
+    def set_master(self, level: int):
+        self.endpoint.SetMasterVolumeLevelScalar(level / 100, None)
+
+    def set_master_mute(self, muted: bool):
+        self.endpoint.SetMute(muted, None)
+
+    def _sessions(self, name: Optional[str] = None):
+        for session in self.utils.GetAllSessions():
+            session_name = session.Process.name() if session.Process else SYSTEM_SOUNDS
+            if name is None or session_name == name:
+                yield session_name, session.SimpleAudioVolume
+
+    def sessions(self) -> list[tuple[str, int, bool]]:
+        seen = {}
+        for name, volume in self._sessions():
+            seen.setdefault(name, (round(volume.GetMasterVolume() * 100), bool(volume.GetMute())))
+        return [(name, level, muted) for name, (level, muted) in seen.items()]
+
+    def set_session(self, name: str, level: int):
+        for _, volume in self._sessions(name):
+            volume.SetMasterVolume(level / 100, None)
+
+    def set_session_mute(self, name: str, muted: bool):
+        for _, volume in self._sessions(name):
+            volume.SetMute(muted, None)
+
+class FakeAudio:
+    """Громкость-заглушка в памяти (AUDIO_BACKEND = fake, тесты)."""
+
+    def __init__(self):
+        self.master = [50, False]
+        self.apps = {'chrome.exe': [80, False], 'cs2.exe': [100, False], SYSTEM_SOUNDS: [60, False]}
+
+    def get_master(self) -> tuple[int, bool]:
+        return self.master[0], self.master[1]
+
+    def set_master(self, level: int):
+        self.master[0] = level
+
+    def set_master_mute(self, muted: bool):
+        self.master[1] = muted
+
+    def sessions(self) -> list[tuple[str, int, bool]]:
+        return [(name, level, muted) for name, (level, muted) in self.apps.items()]
+
+    def set_session(self, name: str, level: int):
+        if name in self.apps:
+            self.apps[name][0] = level
+
+    def set_session_mute(self, name: str, muted: bool):
+        if name in self.apps:
+            self.apps[name][1] = muted
+
+def make_audio(backend: str):
+    """Бэкенд громкости или None, если Core Audio недоступен."""
+    if backend == 'fake':
+        return FakeAudio()
+    try:
+        return PycawAudio()
+    except ImportError as e:
+        logging.warning(f"Микшер недоступен: не установлен pycaw ({e}). Установите: pip install pycaw")
+    except Exception as e:
+        logging.error(f"Микшер недоступен: ошибка Windows Core Audio: {e!r}")
+    return None
+
+def _volume_bar(level: int) -> str:
+    filled = round(level / 10)
+    return "▮" * filled + "▯" * (10 - filled)
+
+def _volume_title(name: str) -> str:
+    if name == MASTER:
+        return "Общая громкость"
+    return "Системные звуки" if name == SYSTEM_SOUNDS else name
+
+class Mixer:
+    """Громкость для клавиатур бота. Сессии в callback_data передаются короткими id
+    (лимит Telegram — 64 байта), 'master' — общая громкость."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.names: OrderedDict[str, str] = OrderedDict()  # id → имя сессии
+        self.ids: dict[str, str] = {}
+        self._next_id = 0
+
+    def target_id(self, name: str) -> str:
+        if name == MASTER:
+            return MASTER
+        tid = self.ids.get(name)
+        if tid is None:
+            tid = format(self._next_id, 'x')
+            self._next_id += 1
+            self.names[tid] = name
+            self.ids[name] = tid
+            if len(self.names) > MIXER_MAX_IDS:
+                _, old = self.names.popitem(last=False)
+                self.ids.pop(old, None)
+        return tid
+
+    def target(self, tid: str) -> str:
+        """Имя по id. KeyError — id устарел."""
+        return MASTER if tid == MASTER else self.names[tid]
+
+    def get_level(self, tid: str) -> tuple[int, bool]:
+        name = self.target(tid)
+        if name == MASTER:
+            return self.backend.get_master()
+        for session, level, muted in self.backend.sessions():
+            if session == name:
+                return level, muted
+        raise KeyError(name)
+
+    def set_level(self, tid: str, level: int):
+        level = max(0, min(100, level))
+        name = self.target(tid)
+        if name == MASTER:
+            self.backend.set_master(level)
+        else:
+            self.backend.set_session(name, level)
+
+    def set_mute(self, tid: str, muted: bool):
+        name = self.target(tid)
+        if name == MASTER:
+            self.backend.set_master_mute(muted)
+        else:
+            self.backend.set_session_mute(name, muted)
+
+    def volume_view(self, tid: str):
+        level, muted = self.get_level(tid)
+        text = f"🔊 {_volume_title(self.target(tid))}: {level}%{' (без звука)' if muted else ''}\n{_volume_bar(level)}"
+        builder = InlineKeyboardBuilder()
+        for preset in VOLUME_PRESETS:
+            builder.button(text=f"{'•' if preset == level else ''}{preset}", callback_data=f"vol_set:{preset}:{tid}")
+        for step in VOLUME_STEPS:
+            builder.button(text=f"{step:+d}", callback_data=f"vol_set:{max(0, min(100, level + step))}:{tid}")
+        builder.button(text="🔈 Вернуть звук" if muted else "🔇 Без звука", callback_data=f"vol_mute:{int(not muted)}:{tid}")
+        if tid == MASTER:
+            builder.button(text="🎚 Микшер", callback_data="vol_mixer")
+        else:
+            builder.button(text="⬅️ Общая", callback_data=f"vol_open:{MASTER}")
+        builder.adjust(len(VOLUME_PRESETS), len(VOLUME_STEPS), 2)
+        return text, builder.as_markup()
+
+    def mixer_view(self):
+        builder = InlineKeyboardBuilder()
+        for name, level, muted in sorted(self.backend.sessions()):
+            builder.button(text=f"{'🔇' if muted else '🔊'} {_volume_title(name)} — {level}%",
+                           callback_data=f"vol_open:{self.target_id(name)}")
+        builder.button(text="⬅️ Общая", callback_data=f"vol_open:{MASTER}")
+        builder.adjust(1)
+        return "🎚 Громкость приложений:", builder.as_markup()